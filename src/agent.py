@@ -1,21 +1,24 @@
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
+import asyncio
+from concurrent.futures import Future
+import time
 import numpy as np
-from transformers import AutoTokenizer, AutoModel
-import torch
 from datetime import datetime
-import os
-import openai
-from dotenv import load_dotenv
 import random
 
-from memory import ShortTermMemory, LongTermMemory, Memory
+from memory import (
+    ShortTermMemory,
+    LongTermMemory,
+    PersistentLongTermMemory,
+    Memory,
+    RetrievalScoring,
+    SharedMemory,
+)
 from conversation_moves import ConversationMoves
-
-# Load environment variables
-load_dotenv()
-
-# Initialize OpenAI client
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from embeddings import EmbeddingService
+from llm import LLMBackend, LLMService
+from metrics import Metrics
+from prompts import ContextPacker, PromptBuilder, TokenCounter
 
 
 class ConversationAgent:
@@ -25,14 +28,42 @@ class ConversationAgent:
         short_term_capacity: int = 10,
         personality: Dict[str, str] = None,
         openai_model: str = "gpt-4o",
+        memory_dir: Optional[str] = None,
+        retrieval_scoring: Optional[RetrievalScoring] = None,
+        context_token_budget: int = 1000,
+        llm_backend: Optional[LLMBackend] = None,
+        seed: Optional[int] = None,
+        shared_memory: Optional[SharedMemory] = None,
     ):
+        # Embedding models are shared across agents rather than loaded per agent,
+        # and requests from all agents are coalesced into batches
+        self.embedding_engine = EmbeddingService.get_engine(model_name)
+
         self.short_term_memory = ShortTermMemory(capacity=short_term_capacity)
-        self.long_term_memory = LongTermMemory()
+        # With a memory directory, long-term memory persists across sessions
+        if memory_dir:
+            self.long_term_memory = PersistentLongTermMemory.open(
+                memory_dir, embedding_dim=self.embedding_engine.embedding_dim
+            )
+        else:
+            self.long_term_memory = LongTermMemory(
+                embedding_dim=self.embedding_engine.embedding_dim
+            )
+        # Agents in one conversation can store its transcript once, in a
+        # segment they all search alongside their own long-term memory
+        self.shared_memory = shared_memory
         self.openai_model = openai_model
-
-        # Initialize the embedding model and tokenizer
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModel.from_pretrained(model_name)
+        # Completions go through the shared pooled, rate-limited backend
+        # unless one is given, e.g. a StubBackend for offline runs
+        self.llm_backend = llm_backend or LLMService.get_backend()
+        # Re-rank long-term memories by similarity, recency and importance;
+        # None keeps plain nearest-neighbour search
+        self.retrieval_scoring = retrieval_scoring
+        # Memory sections of the prompt are packed into a token budget
+        self.context_packer = ContextPacker(
+            TokenCounter(openai_model), max_tokens=context_token_budget
+        )
+        self.last_context_stats: Dict[str, int] = {}
 
         # Store both current and original personality
         self.original_personality = personality or {
@@ -45,23 +76,52 @@ class ConversationAgent:
             "preferred_moves": ["flatter", "defuse"],
         }
         self.personality = self.original_personality.copy()
+        self.prompt_builder = PromptBuilder(self.personality)
 
         # Conversation state
         self.current_context = {}
         self.conversation_history = []
         self.last_move_used = None
+        # A fixed seed makes move selection, and so every prompt, reproducible
+        self._rng = random.Random(seed)
+        self._pending_memory_write: Optional[asyncio.Future] = None
 
     def _get_embedding(self, text: str) -> np.ndarray:
         """Generate embedding for input text."""
-        inputs = self.tokenizer(
-            text, return_tensors="pt", padding=True, truncation=True
-        )
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-
-        # Use mean pooling to get sentence embedding
-        embedding = outputs.last_hidden_state.mean(dim=1).numpy()
-        return embedding[0]
+        if self.shared_memory is not None:
+            embedding = self.shared_memory.get_embedding(text)
+            if embedding is not None:
+                return embedding
+        return self.embedding_engine.embed(text)
+
+    async def _get_embedding_async(self, text: str) -> np.ndarray:
+        """Generate embedding for input text without blocking the event loop."""
+        if self.shared_memory is not None:
+            embedding = self.shared_memory.get_embedding(text)
+            if embedding is not None:
+                return embedding
+            # The speaker may still be embedding the message we just heard
+            pending = self.shared_memory.get_pending_embedding(text)
+            if pending is not None:
+                return await self._await_shared(pending)
+        return await asyncio.wrap_future(self.embedding_engine.submit(text))
+
+    @staticmethod
+    async def _await_shared(future: Future) -> np.ndarray:
+        # Shielded: a cancelled waiter must not cancel a vector others await
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def _submit_response_embedding(self, response: str) -> Future:
+        if self.shared_memory is None:
+            return self.embedding_engine.submit(response)
+        embedding = self.shared_memory.get_embedding(response)
+        if embedding is not None:
+            future = Future()
+            future.set_result(embedding)
+            return future
+        future = self.embedding_engine.submit(response)
+        self.shared_memory.add_pending_embedding(response, future)
+        return future
 
     def _select_conversation_move(self, message: str, context: Dict) -> str:
         """Select an appropriate conversation move based on context and personality."""
@@ -85,163 +145,365 @@ class ConversationAgent:
             ]
 
         # Select a move, with bias towards preferred moves
-        selected_move = random.choice(preferred_moves)
+        selected_move = self._rng.choice(preferred_moves)
         self.last_move_used = selected_move
         return selected_move
 
+    def _remember(
+        self,
+        content: str,
+        embedding: np.ndarray,
+        context: Optional[Dict[str, str]] = None,
+        speaker: Optional[str] = None,
+    ):
+        """Store a message or response in both short- and long-term memory.
+
+        `speaker` is who said it; by default the context's speaker, which is
+        the sender of an incoming message.
+        """
+        # Both stores share one snapshot of the context
+        if context is None:
+            context = self.current_context.copy()
+        self.short_term_memory.add_memory(
+            content=content, importance=1.0, context=context
+        )
+        self._store_long_term(content, embedding, context, speaker)
+
+    def _store_long_term(
+        self,
+        content: str,
+        embedding: np.ndarray,
+        context: Dict[str, str],
+        speaker: Optional[str] = None,
+    ):
+        """Append to the shared transcript if there is one, else to our own store.
+
+        A persistent store also gets new transcript rows copied in as they
+        arrive, so a session's memories survive a crash.
+        """
+        if self.shared_memory is None:
+            self.long_term_memory.add_memory(
+                content=content, embedding=embedding, importance=1.0, context=context
+            )
+            return
+        if speaker is None:
+            speaker = context.get("speaker")
+        self.shared_memory.add_memory(
+            content=content,
+            embedding=embedding,
+            importance=1.0,
+            context=context,
+            speaker=speaker,
+            writer=id(self),
+        )
+        if self._persists_transcript:
+            self.shared_memory.copy_to(self.long_term_memory)
+
+    @property
+    def _persists_transcript(self) -> bool:
+        return isinstance(self.long_term_memory, PersistentLongTermMemory)
+
+    @property
+    def _searched_shared_memory(self) -> Optional[SharedMemory]:
+        """The segment to search with our own store, if it is not copied into it."""
+        if self._persists_transcript:
+            return None
+        return self.shared_memory
+
+    async def _store_long_term_async(
+        self, content: str, context: Dict[str, str], embedding: Future
+    ):
+        """Wait for a response's embedding and append it to long-term memory."""
+        with Metrics.timer("response_embedding"):
+            embedding = await self._await_shared(embedding)
+        with Metrics.timer("memory_write"):
+            self._store_long_term(
+                content, embedding, context, speaker=self.personality["name"]
+            )
+
+    def observe(self, message: str, context: Dict[str, str] = None):
+        """Hear a message in a group conversation without responding to it.
+
+        The message is embedded and stored in both memories in the background,
+        after any earlier pending write, so the agent's next turn recalls it.
+        """
+        if context is not None:
+            self.current_context.update(context)
+        previous = self._pending_memory_write
+        self._pending_memory_write = asyncio.ensure_future(
+            self._observe(message, self.current_context.copy(), previous)
+        )
+
+    async def _observe(
+        self,
+        message: str,
+        context: Dict[str, str],
+        previous: Optional[asyncio.Future],
+    ):
+        # Embed while any earlier write finishes, then store in order
+        embedding = await self._get_embedding_async(message)
+        if previous is not None:
+            await previous
+        with Metrics.timer("memory_write"):
+            self._remember(message, embedding, context)
+
+    async def flush_memory_writes(self):
+        """Wait for any background long-term memory write to finish."""
+        if self._pending_memory_write is not None:
+            pending, self._pending_memory_write = self._pending_memory_write, None
+            await pending
+
+    def _prepare_turn(
+        self,
+        message: str,
+        message_embedding: np.ndarray,
+        timing: Optional[Dict[str, float]] = None,
+        move: Optional[str] = None,
+    ) -> Tuple[List[Memory], List[Tuple[Memory, float]], str]:
+        """Store the incoming message, retrieve memories and pick a move.
+
+        A given `move` is used instead of drawing one, e.g. to replay a log.
+        """
+        with Metrics.timer("memory_write", timing):
+            self._remember(message, message_embedding)
+
+        # Retrieve relevant memories
+        with Metrics.timer("search", timing):
+            recent_memories = self.short_term_memory.get_recent_memories(n=5)
+            if self.retrieval_scoring is not None:
+                relevant_long_term_memories = self.long_term_memory.retrieve(
+                    message_embedding,
+                    k=3,
+                    scoring=self.retrieval_scoring,
+                    shared=self._searched_shared_memory,
+                )
+            else:
+                relevant_long_term_memories = self.long_term_memory.search_memories(
+                    message_embedding, k=3, shared=self._searched_shared_memory
+                )
+
+        with Metrics.timer("packing", timing):
+            recent_memories, relevant_long_term_memories, self.last_context_stats = (
+                self.context_packer.pack(recent_memories, relevant_long_term_memories)
+            )
+
+        # Select conversation move
+        if move is None:
+            selected_move = self._select_conversation_move(
+                message, self.current_context
+            )
+        elif move in ConversationMoves.get_valid_moves():
+            selected_move = self.last_move_used = move
+        else:
+            raise ValueError(f"Unknown conversation move: {move!r}")
+
+        return recent_memories, relevant_long_term_memories, selected_move
+
+    def _format_result(self, response: str, selected_move: str) -> Dict[str, str]:
+        return {
+            "content": response,
+            "move": selected_move,
+            "move_description": ConversationMoves.get_move_description(selected_move)[
+                "description"
+            ],
+            "context_stats": self.last_context_stats,
+        }
+
     def process_message(
-        self, message: str, context: Dict[str, str] = None
+        self,
+        message: str,
+        context: Dict[str, str] = None,
+        move: Optional[str] = None,
     ) -> Dict[str, str]:
-        """Process incoming message and generate a response."""
+        """Process incoming message and generate a response.
+
+        `move` forces the conversation move instead of selecting one.
+        """
         if context is None:
             context = {}
 
         # Update conversation context
         self.current_context.update(context)
 
-        # Generate embedding for the message
-        message_embedding = self._get_embedding(message)
-
-        # Store in short-term memory
-        self.short_term_memory.add_memory(
-            content=message, importance=1.0, context=self.current_context.copy()
+        timing = {}
+        turn_start = time.perf_counter()
+        # Generate embedding for the message, store it and retrieve memories
+        with Metrics.timer("embedding", timing):
+            message_embedding = self._get_embedding(message)
+        recent_memories, relevant_long_term_memories, selected_move = (
+            self._prepare_turn(message, message_embedding, timing, move)
         )
 
-        # Store in long-term memory
-        self.long_term_memory.add_memory(
-            content=message,
-            embedding=message_embedding,
-            importance=1.0,
-            context=self.current_context.copy(),
-        )
+        # Generate response based on memories, current context, and selected move
+        with Metrics.timer("llm", timing):
+            response = self._generate_response(
+                message, recent_memories, relevant_long_term_memories, selected_move
+            )
 
-        # Retrieve relevant memories
-        recent_memories = self.short_term_memory.get_recent_memories(n=5)
-        relevant_long_term_memories = self.long_term_memory.search_memories(
-            message_embedding, k=3
-        )
+        # Store response in memories
+        with Metrics.timer("response_embedding", timing):
+            response_embedding = self._get_embedding(response)
+        with Metrics.timer("memory_write", timing):
+            self._remember(
+                response, response_embedding, speaker=self.personality["name"]
+            )
+        timing["total_latency"] = time.perf_counter() - turn_start
+        Metrics.increment("turns_total")
 
-        # Select conversation move
-        selected_move = self._select_conversation_move(message, self.current_context)
-        move_description = ConversationMoves.format_move_for_prompt(
-            selected_move, self.current_context
+        result = self._format_result(response, selected_move)
+        result["timing"] = timing
+        return result
+
+    async def process_message_async(
+        self,
+        message: str,
+        context: Dict[str, str] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        move: Optional[str] = None,
+    ) -> Dict:
+        """
+        Async variant of `process_message` that never blocks the event loop.
+        If `on_token` is given, the response is streamed and each token is
+        passed to it as soon as the LLM produces it. `move` forces the
+        conversation move instead of selecting one.
+        """
+        if context is None:
+            context = {}
+
+        self.current_context.update(context)
+
+        timing = {}
+        turn_start = time.perf_counter()
+        # Start embedding the message before waiting on the previous turn's
+        # background write, so both embeddings can share a batch. The wait is
+        # its own stage; "embedding" is only the time left after it
+        message_embedding_task = asyncio.ensure_future(
+            self._get_embedding_async(message)
         )
+        with Metrics.timer("memory_flush", timing):
+            await self.flush_memory_writes()
+        with Metrics.timer("embedding", timing):
+            message_embedding = await message_embedding_task
 
-        # Generate response based on memories, current context, and selected move
-        response = self._generate_response(
-            message, recent_memories, relevant_long_term_memories, selected_move
+        recent_memories, relevant_long_term_memories, selected_move = (
+            self._prepare_turn(message, message_embedding, timing, move)
         )
 
-        # Store response in memories
-        response_embedding = self._get_embedding(response)
+        def handle_token(token: str):
+            timing.setdefault("time_to_first_token", time.perf_counter() - turn_start)
+            on_token(token)
+
+        with Metrics.timer("llm", timing):
+            response = await self._generate_response_async(
+                message,
+                recent_memories,
+                relevant_long_term_memories,
+                selected_move,
+                on_token=handle_token if on_token else None,
+            )
+        timing["total_latency"] = time.perf_counter() - turn_start
+        timing.setdefault("time_to_first_token", timing["total_latency"])
+        Metrics.increment("turns_total")
+
+        # Short-term memory is updated now; the response embedding and the
+        # long-term write run in the background while other agents take their
+        # turn, and are always finished before this agent's next turn
+        context = self.current_context.copy()
         self.short_term_memory.add_memory(
-            content=response, importance=1.0, context=self.current_context.copy()
+            content=response, importance=1.0, context=context
         )
-        self.long_term_memory.add_memory(
-            content=response,
-            embedding=response_embedding,
-            importance=1.0,
-            context=self.current_context.copy(),
+        # Embedding starts now and is published to the shared segment, so
+        # listeners reuse it rather than embedding the message again
+        response_embedding = self._submit_response_embedding(response)
+        self._pending_memory_write = asyncio.ensure_future(
+            self._store_long_term_async(response, context, response_embedding)
         )
 
-        return {
-            "content": response,
-            "move": selected_move,
-            "move_description": ConversationMoves.get_move_description(selected_move)[
-                "description"
-            ],
-        }
+        result = self._format_result(response, selected_move)
+        result["timing"] = timing
+        return result
 
-    def _generate_response(
+    def _build_messages(
         self,
         message: str,
         recent_memories: List[Memory],
         relevant_long_term_memories: List[tuple[Memory, float]],
         selected_move: str,
-    ) -> str:
+    ) -> List[Dict[str, str]]:
         """
-        Generate a response using OpenAI's API based on the message, relevant memories,
-        and selected conversation move.
+        Build the chat messages for a response based on the message, relevant
+        memories, and selected conversation move.
         """
-        # Format recent context from memories
-        recent_context = "\n".join(
-            [f"- {memory.content}" for memory in recent_memories]
+        # Static persona and move sections are precompiled; only the memory
+        # sections are formatted per turn
+        system_message = self.prompt_builder.build(
+            selected_move, recent_memories, relevant_long_term_memories
         )
 
-        long_term_context = "\n".join(
-            [
-                f"- {memory.content} (relevance: {score:.2f})"
-                for memory, score in relevant_long_term_memories
-            ]
+        return [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": message},
+        ]
+
+    def _generate_response(
+        self,
+        message: str,
+        recent_memories: List[Memory],
+        relevant_long_term_memories: List[tuple[Memory, float]],
+        selected_move: str,
+    ) -> str:
+        """Generate a response with the LLM backend; raises LLMError on failure."""
+        messages = self._build_messages(
+            message, recent_memories, relevant_long_term_memories, selected_move
+        )
+        return self.llm_backend.complete_sync(
+            messages,
+            model=self.openai_model,
+            temperature=0.7,
+            max_tokens=150,  # Limiting tokens to encourage conciseness
         )
 
-        # Get move description
-        move_info = ConversationMoves.get_move_description(selected_move)
-
-        # Format goals
-        goals = "\n".join([f"- {goal}" for goal in self.personality.get("goals", [])])
-
-        # Create the system message with personality, backstory, and context
-        system_message = f"""You are {self.personality['name']}, an AI agent having a conversation. Your core traits and background:
-
-BACKSTORY:
-{self.personality.get('backstory', 'No detailed backstory available.')}
-
-PERSONALITY:
-- Tone: {self.personality['tone']}
-- Interests: {self.personality['interests']}
-- Communication style: {self.personality['communication_style']}
-
-GOALS:
-{goals}
-
-CURRENT CONVERSATION MOVE:
-- Type: {selected_move}
-- Description: {move_info['description']}
-- Effect: {move_info['effect']}
-- Example structure: {move_info['example']}
-
-CONVERSATION GUIDELINES:
-1. Use the specified conversation move naturally and subtly
-2. Maintain authentic character voice while pursuing your goals
-3. Draw from your specific life experiences and backstory
-4. Keep responses concise (1-3 sentences)
-5. Stay focused on the current topic
-6. Build on the previous message naturally
-
-Recent conversation context:
-{recent_context}
-
-Relevant past context:
-{long_term_context}
-
-Remember to maintain your unique voice while keeping responses brief and engaging."""
-
-        try:
-            response = openai.chat.completions.create(
-                model=self.openai_model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": message},
-                ],
-                temperature=0.7,
-                max_tokens=150,  # Limiting tokens to encourage conciseness
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            # Fallback response in case of API error
-            return (
-                f"I apologize, but I encountered an error while processing your message: {str(e)}. "
-                "Please try again or contact support if the issue persists."
-            )
+    async def _generate_response_async(
+        self,
+        message: str,
+        recent_memories: List[Memory],
+        relevant_long_term_memories: List[tuple[Memory, float]],
+        selected_move: str,
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """Async variant of `_generate_response`, optionally streamed."""
+        messages = self._build_messages(
+            message, recent_memories, relevant_long_term_memories, selected_move
+        )
+        return await self.llm_backend.complete(
+            messages,
+            model=self.openai_model,
+            temperature=0.7,
+            max_tokens=150,
+            on_token=on_token,
+        )
+
+    def save_memory(self):
+        """Persist long-term memory when the agent leaves a conversation.
+
+        A persistent store first gets any transcript rows it is missing, e.g.
+        ones other participants stored after our last message, and the agent
+        then detaches from the segment.
+        """
+        if self.shared_memory is not None and self._persists_transcript:
+            self.shared_memory.copy_to(self.long_term_memory)
+            self.shared_memory = None
+        self.long_term_memory.save()
 
     def update_personality(self, new_traits: Dict[str, str]):
         """Update the agent's personality traits."""
         self.personality.update(new_traits)
+        self.prompt_builder.invalidate()
 
     def revert_personality(self):
         """Revert personality to original settings."""
         self.personality = self.original_personality.copy()
+        self.prompt_builder.set_personality(self.personality)
 
     def get_backstory(self) -> str:
         """Get the current backstory."""
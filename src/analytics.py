@@ -0,0 +1,311 @@
+"""Compact conversation logs into columns and query them.
+
+`compact_logs` turns logger output (`.jsonl` or older `.json` logs) into a
+directory of NumPy columns, one row per logged message. Strings such as agent
+names and moves are dictionary-encoded, message text is kept in one UTF-8
+blob with offsets, and per-turn metrics are float columns (NaN when absent).
+`LogStore` memory-maps only the columns a query touches, so aggregates over
+millions of messages never parse JSON or load message text.
+
+Usage:
+    python src/analytics.py compact logs/ logs/columnar
+    python src/analytics.py summary logs/columnar
+"""
+
+import argparse
+import json
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from logger import load_log
+
+# Columns whose values are strings, stored as int32 codes into a vocabulary
+DICTIONARY_COLUMNS = ("type", "agent", "move")
+METRIC_COLUMNS = (
+    "time_to_first_token",
+    "total_latency",
+    "memory_flush",
+    "embedding",
+    "memory_write",
+    "search",
+    "packing",
+    "llm",
+    "context_tokens",
+    "tokens_saved",
+)
+AGGREGATES = ("count", "sum", "mean", "min", "max")
+
+
+class _Encoder:
+    """Assigns consecutive integer codes to strings as they are first seen."""
+
+    def __init__(self):
+        self.codes: Dict[Optional[str], int] = {}
+
+    def encode(self, value: Optional[str]) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.codes)
+        return code
+
+    @property
+    def vocabulary(self) -> List[Optional[str]]:
+        return list(self.codes)
+
+
+def compact_logs(log_paths: Iterable, output_dir, agents_per_turn: int = 2) -> int:
+    """Write the messages of every log in `log_paths` as columns in `output_dir`.
+
+    `turn` is the conversation round: each of the `agents_per_turn` agents
+    (or each of a log's `participants`) responds once per turn, and
+    non-response messages get turn -1. Returns the number of messages written.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    encoders = {name: _Encoder() for name in DICTIONARY_COLUMNS}
+    columns = {
+        "conversation": array("i"),
+        "turn": array("i"),
+        "length": array("i"),
+        **{name: array("i") for name in DICTIONARY_COLUMNS},
+        **{name: array("d") for name in METRIC_COLUMNS},
+    }
+    content_offsets = array("q", [0])
+    conversations = []
+
+    with open(output_dir / "content.bin", "wb") as content_file:
+        for log_path in log_paths:
+            log = load_log(log_path)
+            conversation = len(conversations)
+            conversations.append(
+                {
+                    key: log.get(key)
+                    for key in (
+                        "session_id",
+                        "start_time",
+                        "agent1",
+                        "agent2",
+                        "participants",
+                        "topic",
+                    )
+                }
+            )
+            group_size = len(log.get("participants") or ()) or agents_per_turn
+
+            responses = 0
+            for message in log["messages"]:
+                content = message.get("content") or ""
+                if message["type"] == "response":
+                    turn = responses // group_size
+                    responses += 1
+                else:
+                    turn = -1
+
+                columns["conversation"].append(conversation)
+                columns["turn"].append(turn)
+                columns["length"].append(len(content))
+                for name in DICTIONARY_COLUMNS:
+                    columns[name].append(encoders[name].encode(message.get(name)))
+                metrics = message.get("metrics", {})
+                for name in METRIC_COLUMNS:
+                    columns[name].append(metrics.get(name, np.nan))
+
+                encoded = content.encode("utf-8")
+                content_file.write(encoded)
+                content_offsets.append(content_offsets[-1] + len(encoded))
+
+    for name, values in columns.items():
+        dtype = "float64" if values.typecode == "d" else "int32"
+        np.save(output_dir / f"{name}.npy", np.frombuffer(values, dtype=dtype))
+    np.save(output_dir / "content_offsets.npy", np.frombuffer(content_offsets, "int64"))
+    with open(output_dir / "dictionaries.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {name: encoders[name].vocabulary for name in DICTIONARY_COLUMNS},
+            f,
+            ensure_ascii=False,
+        )
+    with open(output_dir / "conversations.json", "w", encoding="utf-8") as f:
+        json.dump(conversations, f, ensure_ascii=False)
+    return len(columns["conversation"])
+
+
+class LogStore:
+    """Read-only query API over a directory written by `compact_logs`."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "dictionaries.json", "r", encoding="utf-8") as f:
+            self.dictionaries: Dict[str, List[Optional[str]]] = json.load(f)
+        self._columns: Dict[str, np.ndarray] = {}
+        self._conversations: Optional[List[Dict]] = None
+
+    def __len__(self) -> int:
+        return len(self.column("conversation"))
+
+    def column(self, name: str) -> np.ndarray:
+        """Memory-map one column; only columns that are used are ever read."""
+        values = self._columns.get(name)
+        if values is None:
+            values = np.load(self.path / f"{name}.npy", mmap_mode="r")
+            self._columns[name] = values
+        return values
+
+    @property
+    def conversations(self) -> List[Dict]:
+        if self._conversations is None:
+            with open(self.path / "conversations.json", "r", encoding="utf-8") as f:
+                self._conversations = json.load(f)
+        return self._conversations
+
+    def content(self, row: int) -> str:
+        """Get the text of one message."""
+        offsets = self.column("content_offsets")
+        with open(self.path / "content.bin", "rb") as f:
+            f.seek(offsets[row])
+            return f.read(offsets[row + 1] - offsets[row]).decode("utf-8")
+
+    def _code(self, name: str, value) -> int:
+        if name not in self.dictionaries:
+            return value
+        try:
+            return self.dictionaries[name].index(value)
+        except ValueError:
+            return -1
+
+    def _mask(self, where: Dict) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in where.items():
+            mask &= self.column(name) == self._code(name, value)
+        return mask
+
+    def group_by(
+        self,
+        keys: Sequence[str],
+        value: Optional[str] = None,
+        agg: str = "count",
+        where: Optional[Dict] = None,
+    ) -> Dict[Tuple, float]:
+        """Aggregate `value` over groups of the `keys` columns.
+
+        `where` filters rows by column equality and defaults to responses
+        only. Rows whose value is NaN (a metric that was not logged) are
+        skipped. Keys are returned decoded, as tuples in column order.
+        """
+        if agg not in AGGREGATES:
+            raise ValueError(f"agg must be one of {AGGREGATES}, got {agg!r}")
+        if agg != "count" and value is None:
+            raise ValueError(f"agg={agg!r} needs a value column")
+
+        mask = self._mask({"type": "response"} if where is None else where)
+        values = None
+        if value is not None:
+            values = np.asarray(self.column(value), dtype="float64")[mask]
+            valid = ~np.isnan(values)
+            values = values[valid]
+            mask[mask] = valid
+
+        # Fold the key columns into one int64 code per row, so grouping is a
+        # single 1-D unique instead of a row-wise sort
+        codes = np.zeros(int(mask.sum()), dtype="int64")
+        bounds = []
+        for key in keys:
+            column = np.asarray(self.column(key))[mask].astype("int64")
+            low = int(column.min()) if len(column) else 0
+            size = int(column.max()) - low + 1 if len(column) else 1
+            codes = codes * size + (column - low)
+            bounds.append((low, size))
+        group_codes, inverse = np.unique(codes, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        groups = np.empty((len(group_codes), len(keys)), dtype="int64")
+        for i in reversed(range(len(keys))):
+            low, size = bounds[i]
+            group_codes, groups[:, i] = np.divmod(group_codes, size)
+            groups[:, i] += low
+
+        counts = np.bincount(inverse, minlength=len(groups))
+        if agg == "count":
+            results = counts.astype("float64")
+        elif agg in ("sum", "mean"):
+            results = np.bincount(inverse, weights=values, minlength=len(groups))
+            if agg == "mean":
+                results = results / np.maximum(counts, 1)
+        else:
+            fill = np.inf if agg == "min" else -np.inf
+            results = np.full(len(groups), fill)
+            reduce = np.minimum if agg == "min" else np.maximum
+            reduce.at(results, inverse, values)
+
+        decoded = {}
+        for group, result in zip(groups, results):
+            key = tuple(
+                (
+                    self.dictionaries[name][code]
+                    if name in self.dictionaries
+                    else int(code)
+                )
+                for name, code in zip(keys, group)
+            )
+            decoded[key] = float(result)
+        return decoded
+
+    def move_distribution(self, agent: Optional[str] = None) -> Dict[str, int]:
+        """Count responses per move, for one agent or all of them."""
+        where = {"type": "response"}
+        if agent is not None:
+            where["agent"] = agent
+        return {
+            move: int(count)
+            for (move,), count in self.group_by(["move"], where=where).items()
+        }
+
+    def per_agent(self, value: str = "length", agg: str = "mean") -> Dict[str, float]:
+        return {
+            key[0]: result
+            for key, result in self.group_by(["agent"], value, agg).items()
+        }
+
+    def per_move(self, value: str = "length", agg: str = "mean") -> Dict[str, float]:
+        return {
+            key[0]: result
+            for key, result in self.group_by(["move"], value, agg).items()
+        }
+
+    def per_turn(self, value: str = "length", agg: str = "mean") -> Dict[int, float]:
+        return {
+            key[0]: result
+            for key, result in self.group_by(["turn"], value, agg).items()
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact")
+    compact_parser.add_argument("logs_dir")
+    compact_parser.add_argument("output_dir")
+    summary_parser = subparsers.add_parser("summary")
+    summary_parser.add_argument("store_dir")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        logs = sorted(Path(args.logs_dir).glob("conversation_*.json*"))
+        rows = compact_logs(logs, args.output_dir)
+        print(f"Compacted {len(logs)} logs ({rows} messages) into {args.output_dir}")
+    else:
+        store = LogStore(args.store_dir)
+        print(f"{len(store.conversations)} conversations, {len(store)} messages")
+        print("moves per agent:")
+        for (agent, move), count in sorted(
+            store.group_by(["agent", "move"]).items(), key=str
+        ):
+            print(f"  {agent:<12} {str(move):<20} {int(count)}")
+        print("mean response length per agent:")
+        for agent, length in store.per_agent().items():
+            print(f"  {agent:<12} {length:.0f}")
+        print("mean response length per turn:")
+        for turn, length in store.per_turn().items():
+            print(f"  {turn:<12} {length:.0f}")
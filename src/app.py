@@ -1,14 +1,40 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+import time
+
+# Startup is timed from the first import, so the report covers all of it
+_import_start = time.perf_counter()
+
+from flask import (
+    Flask,
+    Response,
+    render_template,
+    request,
+    jsonify,
+    redirect,
+    url_for,
+)
 from flask_socketio import SocketIO, emit
+from dotenv import load_dotenv
 from agent import ConversationAgent
+from embeddings import EmbeddingService
+from llm import LLMService
 from logger import ConversationLogger
-from datetime import datetime
+from memory import SharedMemory
+from metrics import Metrics
+from preload import Preloader
+from scheduler import (
+    AddressedTurns,
+    RandomTurns,
+    RoundRobinTurns,
+    SimulationScheduler,
+    get_participants,
+)
 import random
 import yaml
 import os
 import json
 from pathlib import Path
 
+load_dotenv()
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "secret!"
@@ -53,6 +79,72 @@ active_simulations = {}
 active_loggers = {}
 
 
+def emit_to_session(event, data, session_id):
+    """Emit an event to one client from outside a request context."""
+    socketio.emit(event, data, to=session_id)
+
+
+# Long-term memory is persisted per persona when a directory is configured
+MEMORY_DIR = os.getenv("MEMORY_DIR")
+
+# Simulations run as background tasks, capped per process
+scheduler = SimulationScheduler(
+    emit=emit_to_session,
+    max_concurrent_sessions=int(os.getenv("MAX_CONCURRENT_SIMULATIONS", 32)),
+)
+
+# Turn-taking policies a client can pick with `turn_policy`
+TURN_POLICIES = {
+    "round_robin": RoundRobinTurns,
+    "random": RandomTurns,
+    "addressed": AddressedTurns,
+}
+
+Metrics.gauge(
+    "active_simulations",
+    lambda: scheduler.active_sessions,
+    "Simulations currently running",
+)
+Metrics.gauge(
+    "embedding_cache_hit_rate",
+    lambda: EmbeddingService.get_cache().get_stats()["hit_rate"],
+    "Share of embedding lookups served from the cache",
+)
+
+# Optional profiling hook: report any turn stage slower than the threshold
+SLOW_STAGE_SECONDS = os.getenv("SLOW_STAGE_SECONDS")
+if SLOW_STAGE_SECONDS:
+
+    def report_slow_stage(stage, seconds, labels):
+        if seconds >= float(SLOW_STAGE_SECONDS):
+            print(f"Slow stage {stage} {labels or ''}: {seconds:.3f}s")
+
+    Metrics.add_hook(report_slow_stage)
+
+
+def get_memory_dir(agent_id):
+    """Directory for a persona's persistent long-term memory, if enabled."""
+    if not MEMORY_DIR:
+        return None
+    return os.path.join(MEMORY_DIR, agent_id)
+
+
+def discard_simulation(session_id):
+    """Stop a session's simulation, save its memories and close its log"""
+    if session_id in active_simulations:
+        active_simulations[session_id]["is_active"] = False
+        scheduler.stop_simulation(session_id)
+
+        for agent in get_participants(active_simulations[session_id]):
+            agent.save_memory()
+
+        if session_id in active_loggers:
+            active_loggers[session_id].end_conversation()
+
+        del active_simulations[session_id]
+        active_loggers.pop(session_id, None)
+
+
 @app.route("/")
 def index():
     # Get the first two agents as default selected agents
@@ -67,34 +159,88 @@ def index():
     )
 
 
+@app.route("/embedding_stats")
+def embedding_stats():
+    """Report load time and memory footprint of the shared embedding models."""
+    return jsonify(EmbeddingService.get_stats())
+
+
+@app.route("/llm_stats")
+def llm_stats():
+    """Report request, retry and throttling counts of the shared LLM backend."""
+    return jsonify(LLMService.get_backend().get_stats())
+
+
+@app.route("/startup")
+def startup():
+    """Report how long startup and each preload step took."""
+    return jsonify(Preloader.report())
+
+
+@app.route("/metrics")
+def metrics():
+    """Expose counters, stage timing histograms and gauges to Prometheus."""
+    return Response(Metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @socketio.on("start_simulation")
 def handle_start_simulation(data):
-    """Start a new conversation simulation between two agents"""
+    """Start a new conversation simulation between two or more agents"""
     session_id = request.sid
-    agent1_id = data.get("agent1")
-    agent2_id = data.get("agent2")
+    # A simulation that failed is still registered; finish it before replacing it
+    discard_simulation(session_id)
+
+    # `agents` lists every participant for a group conversation
+    agent_ids = data.get("agents") or [data.get("agent1"), data.get("agent2")]
     topic = data.get("topic")
 
-    if not all([agent1_id, agent2_id, topic]):
+    if len(agent_ids) < 2 or not all(agent_ids) or not topic:
         emit("error", {"message": "Missing required parameters"})
         return
+    if not all(agent_id in AGENTS for agent_id in agent_ids):
+        emit("error", {"message": "Unknown agent"})
+        return
+    policy_name = data.get("turn_policy", "round_robin")
+    if policy_name not in TURN_POLICIES:
+        emit("error", {"message": f"Unknown turn policy: {policy_name}"})
+        return
+
+    if scheduler.active_sessions >= scheduler.max_concurrent_sessions:
+        Metrics.increment("simulations_rejected_total")
+        emit("error", {"message": "Server is at capacity, please try again later"})
+        return
 
     # Initialize agents
-    agent1 = ConversationAgent(personality=AGENTS[agent1_id], openai_model="gpt-4o")
-    agent2 = ConversationAgent(personality=AGENTS[agent2_id], openai_model="gpt-4o")
+    agents = [
+        ConversationAgent(
+            personality=AGENTS[agent_id],
+            openai_model="gpt-4o",
+            memory_dir=get_memory_dir(agent_id),
+        )
+        for agent_id in agent_ids
+    ]
+    # The transcript is embedded and stored once for all participants
+    shared_memory = SharedMemory(embedding_dim=agents[0].embedding_engine.embedding_dim)
+    for agent in agents:
+        agent.shared_memory = shared_memory
+    names = [agent.personality["name"] for agent in agents]
 
     # Initialize logger
     logger = ConversationLogger(
         session_id=session_id,
-        agent1_name=AGENTS[agent1_id]["name"],
-        agent2_name=AGENTS[agent2_id]["name"],
+        agent1_name=names[0],
+        agent2_name=names[1],
         topic=topic,
+        background=True,
+        participants=names if len(names) > 2 else None,
     )
 
     # Store simulation data and logger
     active_simulations[session_id] = {
-        "agent1": agent1,
-        "agent2": agent2,
+        "agent1": agents[0],
+        "agent2": agents[1],
+        "agents": agents,
+        "turn_policy": TURN_POLICIES[policy_name](),
         "current_message": topic,
         "turn": 0,
         "is_active": True,
@@ -105,8 +251,16 @@ def handle_start_simulation(data):
     logger.log_message("topic", None, topic)
     emit("simulation_message", {"type": "topic", "content": topic})
 
-    # Start the conversation
-    continue_simulation(session_id)
+    # Start the conversation in the background
+    if not scheduler.start_simulation(
+        session_id, active_simulations[session_id], logger
+    ):
+        del active_simulations[session_id]
+        del active_loggers[session_id]
+        Metrics.increment("simulations_rejected_total")
+        emit("error", {"message": "Server is at capacity, please try again later"})
+        return
+    Metrics.increment("simulations_started_total")
 
 
 @socketio.on("stop_simulation")
@@ -115,25 +269,35 @@ def handle_stop_simulation():
     session_id = request.sid
     if session_id in active_simulations:
         active_simulations[session_id]["is_active"] = False
+        scheduler.stop_simulation(session_id)
 
         # Get summaries
-        agent1 = active_simulations[session_id]["agent1"]
-        agent2 = active_simulations[session_id]["agent2"]
+        agents = get_participants(active_simulations[session_id])
+        for agent in agents:
+            agent.save_memory()
 
-        agent1_summary = agent1.get_conversation_summary()
-        agent2_summary = agent2.get_conversation_summary()
+        summaries = [agent.get_conversation_summary() for agent in agents]
 
         # End conversation and save log with summaries
         if session_id in active_loggers:
-            active_loggers[session_id].end_conversation(agent1_summary, agent2_summary)
+            active_loggers[session_id].end_conversation(
+                summaries={
+                    agent.personality["name"]: summary
+                    for agent, summary in zip(agents, summaries)
+                }
+            )
 
         emit(
             "simulation_message",
             {
                 "type": "summary",
                 "content": {
-                    "agent1": agent1_summary,
-                    "agent2": agent2_summary,
+                    "agent1": summaries[0],
+                    "agent2": summaries[1],
+                    "agents": {
+                        agent.personality["name"]: summary
+                        for agent, summary in zip(agents, summaries)
+                    },
                 },
             },
         )
@@ -143,105 +307,23 @@ def handle_stop_simulation():
         del active_loggers[session_id]
 
 
-def continue_simulation(session_id):
-    """Continue the conversation simulation"""
-    if (
-        session_id not in active_simulations
-        or not active_simulations[session_id]["is_active"]
-    ):
-        return
-
-    sim_data = active_simulations[session_id]
-    logger = active_loggers.get(session_id)
-    current_message = sim_data["current_message"]
-    turn = sim_data["turn"]
-
-    # Agent 1's turn
-    agent1_name = sim_data["agent1"].personality["name"]
-    emit(
-        "simulation_message",
-        {"type": "thinking", "agent": agent1_name},
-    )
-
-    response1 = sim_data["agent1"].process_message(
-        current_message,
-        context={
-            "speaker": sim_data["agent2"].personality["name"],
-            "turn": turn,
-            "timestamp": datetime.now().isoformat(),
-        },
-    )
-
-    if logger:
-        logger.log_message(
-            "response",
-            agent1_name,
-            response1["content"],
-            move=response1["move"],
-            move_description=response1["move_description"],
-        )
-
-    emit(
-        "simulation_message",
-        {
-            "type": "response",
-            "agent": agent1_name,
-            "content": response1["content"],
-            "move": response1["move"],
-            "move_description": response1["move_description"],
-        },
-    )
-
-    # Small delay between responses
-    socketio.sleep(2)
-
-    if not sim_data["is_active"]:
-        return
+@socketio.on("disconnect")
+def handle_disconnect():
+    """Stop and discard the simulation of a client that went away"""
+    discard_simulation(request.sid)
 
-    # Agent 2's turn
-    agent2_name = sim_data["agent2"].personality["name"]
-    emit(
-        "simulation_message",
-        {"type": "thinking", "agent": agent2_name},
-    )
-
-    response2 = sim_data["agent2"].process_message(
-        response1["content"],
-        context={
-            "speaker": agent1_name,
-            "turn": turn,
-            "timestamp": datetime.now().isoformat(),
-        },
-    )
-
-    if logger:
-        logger.log_message(
-            "response",
-            agent2_name,
-            response2["content"],
-            move=response2["move"],
-            move_description=response2["move_description"],
-        )
-
-    emit(
-        "simulation_message",
-        {
-            "type": "response",
-            "agent": agent2_name,
-            "content": response2["content"],
-            "move": response2["move"],
-            "move_description": response2["move_description"],
-        },
-    )
 
-    # Update simulation state
-    sim_data["current_message"] = response2["content"]
-    sim_data["turn"] += 1
+Preloader.record("app import", time.perf_counter() - _import_start)
 
-    # Continue the simulation after a delay
-    socketio.sleep(2)
-    if sim_data["is_active"]:
-        continue_simulation(session_id)
+# Models are warmed in the background by default so the server accepts
+# connections at once; PRELOAD=eager blocks until they are loaded and
+# PRELOAD=off loads them on first use
+PRELOAD = os.getenv("PRELOAD", "background")
+# `python src/app.py` runs the debug reloader: this module executes in a file
+# watcher process and again in the serving child, and only the child serves
+reloader_watcher = __name__ == "__main__" and not os.getenv("WERKZEUG_RUN_MAIN")
+if PRELOAD != "off" and not reloader_watcher:
+    Preloader.preload(background=PRELOAD != "eager")
 
 
 if __name__ == "__main__":
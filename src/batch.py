@@ -0,0 +1,278 @@
+"""Run many simulations headlessly across a process pool.
+
+Takes agent groups and topics from `config/agents.yaml` and `config/topics.yaml`,
+runs every (group, topic) conversation for a fixed number of turns and streams
+one JSON line per finished conversation to the output file. Each worker
+process loads the embedding model once and interleaves `--concurrency`
+conversations on its own event loop. A summary with conversations per minute
+and the mean time per turn spent in each stage is printed at the end.
+
+Usage:
+    python src/batch.py [--pairs alice:bob,charlie:diana:eddy] [--turns 5] [--repeat 1]
+        [--workers 4] [--concurrency 8] [--backend stub] [--output results.jsonl]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+
+from agent import ConversationAgent
+from embeddings import EmbeddingService
+from memory import SharedMemory
+from scheduler import RoundRobinTurns
+
+CONFIG_DIR = Path(__file__).parent / "config"
+LOGS_DIR = Path(__file__).parent.parent / "logs"
+DEFAULT_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+
+def load_config() -> Tuple[Dict[str, Dict], List[str]]:
+    """Get agent personalities keyed by id, and the list of topics."""
+    with open(CONFIG_DIR / "agents.yaml", "r") as f:
+        agents = yaml.safe_load(f)["agents"]
+    with open(CONFIG_DIR / "topics.yaml", "r") as f:
+        topics = yaml.safe_load(f)["topics"]
+    return agents, topics
+
+
+def make_jobs(
+    agents: Dict[str, Dict],
+    topics: List[str],
+    pairs: Optional[List[Tuple[str, ...]]] = None,
+    turns: int = 5,
+    repeat: int = 1,
+    seed: int = 0,
+) -> List[Dict]:
+    """Build one job per (group, topic, repetition); all pairs if none given.
+
+    Each entry of `pairs` is a tuple of two or more agent ids.
+    """
+    if pairs is None:
+        pairs = list(combinations(agents.keys(), 2))
+    jobs = []
+    for _ in range(repeat):
+        for group in pairs:
+            for topic in topics:
+                jobs.append(
+                    {
+                        "agents": [agents[agent_id] for agent_id in group],
+                        "topic": topic,
+                        "turns": turns,
+                        "seed": seed + len(jobs),
+                    }
+                )
+    return jobs
+
+
+async def run_conversation(job: Dict, model_name: str = DEFAULT_MODEL) -> Dict:
+    """Run one conversation for `job["turns"]` turns and return its transcript.
+
+    Every agent speaks once per turn in round-robin order; the others hear
+    each reply in the background while the next agent prepares its own.
+    """
+    start = time.perf_counter()
+    agents = [
+        ConversationAgent(
+            model_name=model_name, personality=personality, seed=job["seed"] + i
+        )
+        for i, personality in enumerate(job["agents"])
+    ]
+    shared_memory = SharedMemory(embedding_dim=agents[0].embedding_engine.embedding_dim)
+    for agent in agents:
+        agent.shared_memory = shared_memory
+
+    policy = RoundRobinTurns()
+    message = job["topic"]
+    speaker = policy.next_speaker(agents, None, message)
+    last_speaker = len(agents) - 1
+    responses = []
+    for turn in range(job["turns"]):
+        for _ in range(len(agents)):
+            agent = agents[speaker]
+            response = await agent.process_message_async(
+                message,
+                context={
+                    "speaker": agents[last_speaker].personality["name"],
+                    "turn": turn,
+                    "timestamp": datetime.now().isoformat(),
+                },
+            )
+            message = response["content"]
+            last_speaker, speaker = speaker, policy.next_speaker(
+                agents, speaker, message
+            )
+            for i, listener in enumerate(agents):
+                if i not in (last_speaker, speaker):
+                    listener.observe(
+                        message,
+                        {"speaker": agent.personality["name"], "turn": turn},
+                    )
+            responses.append(
+                {
+                    "agent": agent.personality["name"],
+                    "content": message,
+                    "move": response["move"],
+                    "timing": response["timing"],
+                    "context_stats": response["context_stats"],
+                }
+            )
+    await asyncio.gather(*(agent.flush_memory_writes() for agent in agents))
+
+    return {
+        "agents": [personality["name"] for personality in job["agents"]],
+        "topic": job["topic"],
+        "seed": job["seed"],
+        "elapsed_seconds": time.perf_counter() - start,
+        "responses": responses,
+    }
+
+
+# One event loop per worker process, kept for all of its chunks: the shared
+# LLM backend's HTTP client binds its connection pool to the loop it first
+# runs on, so a fresh loop per chunk would reuse connections from a closed one
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+
+def _init_worker(model_name: str, torch_threads: int):
+    """Load the worker's embedding model once, before any conversation runs."""
+    import torch
+
+    torch.set_num_threads(torch_threads)
+    EmbeddingService.get_engine(model_name)
+    _get_loop()
+
+
+def _run_chunk(jobs: List[Dict], model_name: str) -> List[Dict]:
+    async def run_all():
+        return await asyncio.gather(
+            *(run_conversation(job, model_name) for job in jobs),
+            return_exceptions=True,
+        )
+
+    results = []
+    for job, result in zip(jobs, _get_loop().run_until_complete(run_all())):
+        if isinstance(result, BaseException):
+            result = {
+                "agents": [personality["name"] for personality in job["agents"]],
+                "topic": job["topic"],
+                "seed": job["seed"],
+                "error": str(result),
+            }
+        results.append(result)
+    return results
+
+
+def run_batch(
+    jobs: List[Dict],
+    output_path: str,
+    workers: int = None,
+    concurrency: int = 8,
+    model_name: str = DEFAULT_MODEL,
+) -> Dict:
+    """Run `jobs` across a process pool, streaming results to `output_path`.
+
+    Returns a summary with throughput and the mean seconds per turn spent in
+    each stage (embedding, retrieval, LLM).
+    """
+    workers = workers or os.cpu_count()
+    torch_threads = max(1, os.cpu_count() // workers)
+    chunks = [jobs[i : i + concurrency] for i in range(0, len(jobs), concurrency)]
+
+    start = time.perf_counter()
+    completed = failed = turns = 0
+    stage_totals: Dict[str, float] = {}
+    # Spawned workers avoid inheriting torch and tokenizer thread state
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(model_name, torch_threads),
+    ) as pool, open(output_path, "w", encoding="utf-8") as output:
+        futures = [pool.submit(_run_chunk, chunk, model_name) for chunk in chunks]
+        for future in as_completed(futures):
+            for result in future.result():
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                if "error" in result:
+                    failed += 1
+                    continue
+                completed += 1
+                for response in result["responses"]:
+                    turns += 1
+                    for stage, seconds in response["timing"].items():
+                        stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+            output.flush()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "conversations": completed,
+        "failed": failed,
+        "responses": turns,
+        "elapsed_seconds": elapsed,
+        "conversations_per_minute": completed / elapsed * 60,
+        "stage_seconds_per_response": {
+            stage: total / max(turns, 1) for stage, total in stage_totals.items()
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--pairs", help="comma-separated groups of agent ids, e.g. alice:bob:eddy"
+    )
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--backend", choices=["openai", "stub"])
+    parser.add_argument("--stub-latency", type=float)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    # Workers configure their LLM backend from the environment they inherit
+    if args.backend:
+        os.environ["LLM_BACKEND"] = args.backend
+    if args.stub_latency is not None:
+        os.environ["LLM_STUB_LATENCY"] = str(args.stub_latency)
+
+    agents, topics = load_config()
+    pairs = None
+    if args.pairs:
+        pairs = [tuple(pair.split(":")) for pair in args.pairs.split(",")]
+    jobs = make_jobs(agents, topics, pairs, args.turns, args.repeat, args.seed)
+
+    output_path = args.output
+    if output_path is None:
+        LOGS_DIR.mkdir(exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_path = LOGS_DIR / f"batch_{timestamp}.jsonl"
+
+    print(f"Running {len(jobs)} conversations on {args.workers} workers")
+    summary = run_batch(
+        jobs, output_path, args.workers, args.concurrency, model_name=args.model
+    )
+    print(f"Wrote {output_path}")
+    print(f"conversations/min: {summary['conversations_per_minute']:.1f}")
+    print(f"failed:            {summary['failed']}")
+    for stage, seconds in summary["stage_seconds_per_response"].items():
+        print(f"{stage + ':':<20} {seconds * 1000:8.1f} ms/response")
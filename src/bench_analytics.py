@@ -0,0 +1,107 @@
+"""Benchmark columnar log queries against scanning the JSON logs.
+
+Writes `--conversations` synthetic logs in the logger's JSONL format, then
+times per-agent move counts and mean response length computed by parsing
+every log (the naive way) and by `LogStore` over compacted columns.
+
+Usage:
+    python src/bench_analytics.py [--conversations 100000] [--turns 5]
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from analytics import LogStore, compact_logs
+from conversation_moves import ConversationMoves
+from logger import load_log
+
+AGENTS = ["Alice", "Bob", "Charlie", "Diana", "Eddy"]
+
+
+def write_logs(logs_dir: Path, conversations: int, turns: int):
+    rng = np.random.default_rng(0)
+    moves = list(ConversationMoves.get_valid_moves())
+    words = "the quick brown fox jumps over a lazy dog again".split()
+    for i in range(conversations):
+        agent1, agent2 = rng.choice(AGENTS, size=2, replace=False)
+        records = [
+            {
+                "type": "session_start",
+                "session_id": f"bench-{i}",
+                "start_time": "2025-03-11T03:10:38",
+                "agent1": agent1,
+                "agent2": agent2,
+                "topic": "What's your take on AI and creativity?",
+            },
+            {"type": "topic", "agent": None, "content": "AI and creativity?"},
+        ]
+        for turn in range(turns):
+            for agent in (agent1, agent2):
+                move = moves[rng.integers(len(moves))]
+                records.append(
+                    {
+                        "timestamp": "2025-03-11T03:10:42",
+                        "type": "response",
+                        "agent": agent,
+                        "content": " ".join(rng.choice(words, rng.integers(5, 60))),
+                        "move": move,
+                        "move_description": move,
+                        "metrics": {"total_latency": float(rng.random())},
+                    }
+                )
+        records.append({"type": "session_end", "end_time": "2025-03-11T03:12:00"})
+        with open(logs_dir / f"conversation_{i:07d}.jsonl", "w") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+
+
+def naive_scan(log_paths):
+    moves = Counter()
+    lengths = defaultdict(list)
+    for path in log_paths:
+        for message in load_log(path)["messages"]:
+            if message["type"] == "response":
+                moves[(message["agent"], message["move"])] += 1
+                lengths[message["agent"]].append(len(message["content"]))
+    return moves, {agent: np.mean(values) for agent, values in lengths.items()}
+
+
+def columnar_query(store: LogStore):
+    return store.group_by(["agent", "move"]), store.per_agent("length")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=100_000)
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logs_dir = Path(tmp) / "logs"
+        logs_dir.mkdir()
+        write_logs(logs_dir, args.conversations, args.turns)
+        log_paths = sorted(logs_dir.glob("*.jsonl"))
+
+        start = time.perf_counter()
+        naive_moves, naive_lengths = naive_scan(log_paths)
+        naive = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rows = compact_logs(log_paths, Path(tmp) / "columnar")
+        compaction = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store = LogStore(Path(tmp) / "columnar")
+        moves, lengths = columnar_query(store)
+        columnar = time.perf_counter() - start
+
+        assert all(moves[key] == count for key, count in naive_moves.items())
+        print(f"{args.conversations} conversations, {rows} messages")
+        print(f"naive JSON scan:   {naive:8.3f} s")
+        print(f"compaction (once): {compaction:8.3f} s")
+        print(f"columnar query:    {columnar:8.3f} s  ({naive / columnar:.0f}x)")
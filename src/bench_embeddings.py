@@ -0,0 +1,71 @@
+"""Compare per-call embedding with the batching EmbeddingEngine under concurrency.
+
+Every call embeds a distinct text, so the engine's merging of identical texts
+within a batch window does not inflate the batched throughput.
+
+Usage:
+    python src/bench_embeddings.py [--callers 32] [--requests 20]
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from embeddings import EmbeddingService, EmbeddingEngine
+
+MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+SAMPLE_TEXTS = [
+    "What's your take on AI and creativity?",
+    "When I was documenting indigenous art forms in South America, I often "
+    "thought about how technology could help preserve cultural expressions.",
+    "Absolutely, it's fascinating to see how AI can spark new avenues for creativity.",
+    "Tell me about a recent experience that surprised you.",
+]
+
+
+def make_text(caller: int, request: int, run: str = "") -> str:
+    """A sample text made unique by the caller, request and run tag."""
+    text = SAMPLE_TEXTS[(caller + request) % len(SAMPLE_TEXTS)]
+    return f"{text} ({run}{caller}-{request})"
+
+
+def run_callers(embed, callers: int, requests: int, run: str = "") -> float:
+    """Run `callers` threads each embedding `requests` texts; return texts/sec.
+
+    Texts are unique per call; pass a different `run` tag to keep texts
+    unique across runs against the same cache.
+    """
+
+    def caller(offset: int):
+        for i in range(requests):
+            embed(make_text(offset, i, run))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        list(pool.map(caller, range(callers)))
+    return callers * requests / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--callers", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait", type=float, default=0.005)
+    args = parser.parse_args()
+
+    model = EmbeddingService.get_model(MODEL_NAME)
+    engine = EmbeddingEngine(
+        model, max_batch_size=args.max_batch_size, max_wait=args.max_wait
+    )
+
+    # Warm up both paths so one-off initialisation is not measured
+    model.embed(SAMPLE_TEXTS[0])
+    engine.embed(SAMPLE_TEXTS[0])
+
+    per_call = run_callers(model.embed, args.callers, args.requests, run="per-call ")
+    batched = run_callers(engine.embed, args.callers, args.requests, run="batched ")
+
+    print(f"per-call: {per_call:8.1f} texts/s")
+    print(f"batched:  {batched:8.1f} texts/s  ({batched / per_call:.1f}x)")
+    print(f"engine:   {engine.get_stats()}")
@@ -0,0 +1,61 @@
+"""Compare recall and query latency of each long-term memory index type.
+
+Builds every index type over the same synthetic clustered embeddings and
+measures recall@k against exact (flat) search along with the mean query time.
+
+Usage:
+    python src/bench_index.py [--size 100000] [--dim 768] [--queries 1000] [--k 5]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from memory import INDEX_TYPES, build_index
+
+
+def make_embeddings(size: int, dim: int, clusters: int = 256, seed: int = 0):
+    """Generate clustered vectors, closer to real sentence embeddings than noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype("float32")
+    labels = rng.integers(clusters, size=size)
+    noise = rng.normal(scale=0.3, size=(size, dim)).astype("float32")
+    return centers[labels] + noise
+
+
+def bench_index(index_type: str, embeddings, queries, k: int, exact_ids):
+    start = time.perf_counter()
+    index = build_index(index_type, embeddings)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, ids = index.search(queries, k)
+    query_time = (time.perf_counter() - start) / len(queries)
+
+    recall = np.mean(
+        [len(set(found) & set(exact)) / k for found, exact in zip(ids, exact_ids)]
+    )
+    return build_time, query_time, recall
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    data = make_embeddings(args.size + args.queries, args.dim)
+    embeddings, queries = data[: args.size], data[args.size :]
+    _, exact_ids = build_index("flat", embeddings).search(queries, args.k)
+
+    print(f"{'index':>6} {'build s':>8} {'us/query':>9} {'recall@' + str(args.k):>9}")
+    for index_type in INDEX_TYPES:
+        build_time, query_time, recall = bench_index(
+            index_type, embeddings, queries, args.k, exact_ids
+        )
+        print(
+            f"{index_type:>6} {build_time:>8.2f} {query_time * 1e6:>9.1f} {recall:>9.3f}"
+        )
@@ -0,0 +1,88 @@
+"""Benchmark LongTermMemory insert cost and per-memory footprint.
+
+Reports the per-insert cost of LongTermMemory.add_memory as the store grows,
+then the bytes each stored memory record takes in the columnar layout
+compared with a list of per-memory dataclasses.
+
+Usage:
+    python src/bench_memory.py [--total 100000] [--dim 768] [--window 10000]
+"""
+
+import argparse
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict
+
+import numpy as np
+
+from memory import LongTermMemory, MemoryColumns
+
+
+@dataclass
+class DataclassMemory:
+    """The previous memory record: a regular dataclass with its own context."""
+
+    content: str
+    timestamp: datetime
+    importance: float
+    context: Dict[str, str]
+
+
+def bench_add_memory(total: int, dim: int, window: int):
+    """Insert `total` random vectors and report the mean add cost per window."""
+    rng = np.random.default_rng(0)
+    memory = LongTermMemory(embedding_dim=dim)
+    vectors = rng.random((window, dim), dtype=np.float32)
+
+    print(f"{'memories':>10} {'us/add':>10}")
+    while len(memory.memories) < total:
+        start = time.perf_counter()
+        for i in range(window):
+            memory.add_memory(content="benchmark", embedding=vectors[i])
+        elapsed = time.perf_counter() - start
+        print(f"{len(memory.memories):>10} {elapsed / window * 1e6:>10.1f}")
+
+
+def bench_footprint(total: int):
+    """Measure bytes per memory record, excluding the embedding row."""
+    # Contents are shared between layouts so only record overhead is measured
+    contents = [f"message {i}" for i in range(total)]
+    contexts = [
+        {"speaker": "Alice", "turn": i // 4, "timestamp": f"2025-03-11T03:{i // 4}"}
+        for i in range(total)
+    ]
+
+    def measure(build):
+        tracemalloc.start()
+        store = build()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return size / total, store
+
+    def build_dataclasses():
+        return [
+            DataclassMemory(content, datetime.now(), 1.0, context.copy())
+            for content, context in zip(contents, contexts)
+        ]
+
+    def build_columns():
+        columns = MemoryColumns(initial_capacity=total)
+        for content, context in zip(contents, contexts):
+            columns.append(content, time.time(), 1.0, context)
+        return columns
+
+    before, _ = measure(build_dataclasses)
+    after, _ = measure(build_columns)
+    print(f"bytes/memory: dataclass {before:.0f}, columnar {after:.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--total", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--window", type=int, default=10_000)
+    args = parser.parse_args()
+    bench_add_memory(args.total, args.dim, args.window)
+    bench_footprint(args.total)
@@ -0,0 +1,94 @@
+"""Benchmark a shared transcript segment against per-agent transcript copies.
+
+Runs the same group conversation against a zero-latency stub LLM twice: once
+with every agent storing each message in its own long-term memory, and once
+with the agents sharing one `SharedMemory` segment. Each run gets its own
+engine without a cache, so no run reuses another's vectors. Reports the
+long-term rows and vector bytes held across all agents, embedding requests
+that reached the engine, and time per response.
+
+Usage:
+    python src/bench_shared_memory.py [--participants 2] [--turns 50]
+"""
+
+import argparse
+import asyncio
+import time
+from pathlib import Path
+from typing import Dict
+
+import yaml
+
+from agent import ConversationAgent
+from embeddings import EmbeddingEngine, EmbeddingService
+from llm import StubBackend
+from memory import SharedMemory
+from scheduler import RoundRobinTurns
+
+CONFIG_DIR = Path(__file__).parent / "config"
+MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+
+
+async def run(participants: int, turns: int, shared: bool) -> Dict[str, float]:
+    with open(CONFIG_DIR / "agents.yaml", "r") as f:
+        personalities = list(yaml.safe_load(f)["agents"].values())
+    backend = StubBackend(latency=0.0)
+    engine = EmbeddingEngine(EmbeddingService.get_model(MODEL_NAME))
+    agents = [
+        ConversationAgent(
+            personality=personalities[i % len(personalities)],
+            llm_backend=backend,
+            seed=i,
+        )
+        for i in range(participants)
+    ]
+    for agent in agents:
+        agent.embedding_engine = engine
+    shared_memory = None
+    if shared:
+        shared_memory = SharedMemory(embedding_dim=engine.embedding_dim)
+        for agent in agents:
+            agent.shared_memory = shared_memory
+
+    policy = RoundRobinTurns()
+    message = "What's your take on AI and creativity?"
+    speaker, last_speaker = 0, participants - 1
+    start = time.perf_counter()
+    for _ in range(turns * participants):
+        # As in the scheduler, the context names whoever said the message
+        response = await agents[speaker].process_message_async(
+            message, context={"speaker": agents[last_speaker].personality["name"]}
+        )
+        message = response["content"]
+        last_speaker, speaker = speaker, policy.next_speaker(agents, speaker, message)
+        context = {"speaker": agents[last_speaker].personality["name"]}
+        for i, listener in enumerate(agents):
+            if i not in (last_speaker, speaker):
+                listener.observe(message, context)
+    await asyncio.gather(*(agent.flush_memory_writes() for agent in agents))
+    elapsed = time.perf_counter() - start
+
+    stores = [agent.long_term_memory for agent in agents]
+    if shared_memory is not None:
+        stores.append(shared_memory)
+    return {
+        "rows": sum(len(store.memories) for store in stores),
+        "vector_bytes": sum(store.embeddings.nbytes for store in stores),
+        "embedding_requests": engine.request_count,
+        "ms_per_response": elapsed / (turns * participants) * 1e3,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participants", type=int, default=2)
+    parser.add_argument("--turns", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'':<10} {'rows':>8} {'vector KiB':>11} {'requests':>8} {'ms/resp':>8}")
+    for name, shared in (("private", False), ("shared", True)):
+        result = asyncio.run(run(args.participants, args.turns, shared))
+        print(
+            f"{name:<10} {result['rows']:>8} {result['vector_bytes'] / 1024:>11.1f} "
+            f"{result['embedding_requests']:>8} {result['ms_per_response']:>8.2f}"
+        )
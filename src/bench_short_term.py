@@ -0,0 +1,52 @@
+"""Benchmark ShortTermMemory add/evict and recent retrieval across capacities.
+
+Fills each memory to capacity, then measures the cost of adding under churn
+(every add evicts) and of get_recent_memories(n=5), for each eviction policy.
+
+Usage:
+    python src/bench_short_term.py [--capacities 10,100,1000,10000,100000]
+"""
+
+import argparse
+import random
+import time
+
+from memory import ImportanceEviction, RecencyEviction, ShortTermMemory
+
+POLICIES = {"importance": ImportanceEviction, "recency": RecencyEviction}
+
+
+def bench_capacity(policy_cls, capacity: int, operations: int):
+    memory = ShortTermMemory(capacity=capacity, eviction_policy=policy_cls())
+    rng = random.Random(0)
+    for _ in range(capacity):
+        memory.add_memory("warmup", importance=rng.choice([0.5, 1.0, 2.0]))
+
+    start = time.perf_counter()
+    for _ in range(operations):
+        memory.add_memory("churn", importance=rng.choice([0.5, 1.0, 2.0]))
+    add_time = (time.perf_counter() - start) / operations
+
+    start = time.perf_counter()
+    for _ in range(operations):
+        memory.get_recent_memories(n=5)
+    recent_time = (time.perf_counter() - start) / operations
+    return add_time, recent_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--capacities", default="10,100,1000,10000,100000")
+    parser.add_argument("--operations", type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(f"{'policy':>10} {'capacity':>9} {'us/add':>8} {'us/recent':>10}")
+    for name, policy_cls in POLICIES.items():
+        for capacity in (int(c) for c in args.capacities.split(",")):
+            add_time, recent_time = bench_capacity(
+                policy_cls, capacity, args.operations
+            )
+            print(
+                f"{name:>10} {capacity:>9} {add_time * 1e6:>8.2f} "
+                f"{recent_time * 1e6:>10.2f}"
+            )
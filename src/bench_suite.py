@@ -0,0 +1,245 @@
+"""Reproducible benchmark suite for the agent and memory hot paths.
+
+Runs each benchmark `--repeat` times with fixed seeds and keeps the median:
+LongTermMemory.add_memory and search_memories across store sizes,
+ShortTermMemory under churn, batched embedding throughput, and full
+process_message turns against the stub LLM backend. Results are written to
+JSON; with `--baseline` they are compared against a stored run and any metric
+worse than `--tolerance` is flagged as a regression (exit status 1).
+
+Usage:
+    python src/bench_suite.py [--output benchmarks/latest.json]
+        [--baseline benchmarks/baseline.json] [--tolerance 0.1]
+        [--only long_term,short_term] [--update-baseline]
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import faiss
+import numpy as np
+
+from bench_index import make_embeddings
+from bench_short_term import bench_capacity
+from memory import ImportanceEviction, LongTermMemory
+
+BENCHMARKS_DIR = Path(__file__).parent.parent / "benchmarks"
+MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+
+# name -> {"value": float, "unit": str, "higher_is_better": bool}
+Results = Dict[str, Dict]
+
+
+def _result(value: float, unit: str, higher_is_better: bool = False) -> Dict:
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def bench_long_term(sizes: List[int], dim: int = 768, window: int = 1000) -> Results:
+    """Per-add and per-search cost once the store holds each of `sizes`."""
+    results = {}
+    data = make_embeddings(max(sizes) + window, dim)
+    queries = make_embeddings(200, dim, seed=1)
+    memory = LongTermMemory(embedding_dim=dim)
+    for size in sorted(sizes):
+        while len(memory.memories) < size - window:
+            memory.add_memory("benchmark", data[len(memory.memories)])
+
+        start = time.perf_counter()
+        while len(memory.memories) < size:
+            memory.add_memory("benchmark", data[len(memory.memories)])
+        add_time = (time.perf_counter() - start) / window
+
+        start = time.perf_counter()
+        for query in queries:
+            memory.search_memories(query, k=5)
+        search_time = (time.perf_counter() - start) / len(queries)
+
+        results[f"long_term.add@{size}"] = _result(add_time * 1e6, "us")
+        results[f"long_term.search@{size}"] = _result(search_time * 1e6, "us")
+    return results
+
+
+def bench_short_term(capacities: List[int], operations: int = 10_000) -> Results:
+    """Add-under-churn and recent-retrieval cost at each capacity."""
+    results = {}
+    for capacity in capacities:
+        add_time, recent_time = bench_capacity(ImportanceEviction, capacity, operations)
+        results[f"short_term.add@{capacity}"] = _result(add_time * 1e6, "us")
+        results[f"short_term.recent@{capacity}"] = _result(recent_time * 1e6, "us")
+    return results
+
+
+_engine = None
+_runs = 0
+
+
+def _uncached_engine():
+    """A batching engine without a cache, so every call reaches the model.
+
+    Agents otherwise share the process-wide cached engine, and with the
+    deterministic stub every repeat after the first would be all cache hits.
+    """
+    global _engine
+    if _engine is None:
+        from embeddings import EmbeddingEngine, EmbeddingService
+
+        _engine = EmbeddingEngine(EmbeddingService.get_model(MODEL_NAME))
+    return _engine
+
+
+def _run_tag() -> str:
+    """A tag that differs on every call, to keep benchmark texts unique."""
+    global _runs
+    _runs += 1
+    return f"run {_runs} "
+
+
+def bench_embedding(callers: int = 16, requests: int = 10) -> Results:
+    """Texts per second through the batching engine, one unique text per call."""
+    from bench_embeddings import SAMPLE_TEXTS, run_callers
+
+    engine = _uncached_engine()
+    engine.embed(SAMPLE_TEXTS[0])
+    throughput = run_callers(engine.embed, callers, requests, run=_run_tag())
+    return {"embedding.throughput": _result(throughput, "texts/s", True)}
+
+
+def bench_turns(turns: int = 20) -> Results:
+    """Full turns (embedding, memory, prompt) with a zero-latency stub LLM."""
+    from agent import ConversationAgent
+    from llm import StubBackend
+
+    backend = StubBackend(latency=0.0)
+    engine = _uncached_engine()
+    results = {}
+
+    agent = ConversationAgent(llm_backend=backend, seed=0)
+    agent.embedding_engine = engine
+    message = "What's your take on AI and creativity?"
+    start = time.perf_counter()
+    for _ in range(turns):
+        message = agent.process_message(message)["content"]
+    results["turn.process_message"] = _result(
+        (time.perf_counter() - start) / turns * 1e3, "ms"
+    )
+
+    async def run_async():
+        agent = ConversationAgent(llm_backend=backend, seed=0)
+        agent.embedding_engine = engine
+        message = "What's your take on AI and creativity?"
+        start = time.perf_counter()
+        for _ in range(turns):
+            message = (await agent.process_message_async(message))["content"]
+        await agent.flush_memory_writes()
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run_async())
+    results["turn.process_message_async"] = _result(elapsed / turns * 1e3, "ms")
+    return results
+
+
+def run_suite(benchmarks: Dict[str, Callable[[], Results]], repeat: int = 3) -> Results:
+    """Run each benchmark `repeat` times and keep the median of every metric."""
+    results = {}
+    for name, benchmark in benchmarks.items():
+        print(f"running {name}...", file=sys.stderr)
+        runs = [benchmark() for _ in range(repeat)]
+        for metric, first in runs[0].items():
+            results[metric] = {
+                **first,
+                "value": statistics.median(run[metric]["value"] for run in runs),
+            }
+    return results
+
+
+def compare(results: Results, baseline: Results, tolerance: float) -> List[str]:
+    """Print each metric against the baseline and return the regressed ones."""
+    regressions = []
+    print(f"{'metric':<32} {'baseline':>12} {'current':>12} {'change':>8}")
+    for metric, result in results.items():
+        if metric not in baseline:
+            print(f"{metric:<32} {'-':>12} {result['value']:>12.2f} {'new':>8}")
+            continue
+        before, after = baseline[metric]["value"], result["value"]
+        change = (after - before) / before if before else 0.0
+        worse = -change if result["higher_is_better"] else change
+        status = ""
+        if worse > tolerance:
+            regressions.append(metric)
+            status = "  REGRESSION"
+        print(
+            f"{metric:<32} {before:>12.2f} {after:>12.2f} {change:>+8.1%} "
+            f"{result['unit']}{status}"
+        )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default=str(BENCHMARKS_DIR / "latest.json"))
+    parser.add_argument("--baseline", default=str(BENCHMARKS_DIR / "baseline.json"))
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--capacities", default="10,1000,100000")
+    parser.add_argument(
+        "--only", help="comma-separated: long_term,short_term,embedding,turns"
+    )
+    args = parser.parse_args()
+
+    benchmarks = {
+        "long_term": lambda: bench_long_term(
+            [int(size) for size in args.sizes.split(",")]
+        ),
+        "short_term": lambda: bench_short_term(
+            [int(capacity) for capacity in args.capacities.split(",")]
+        ),
+        "embedding": bench_embedding,
+        "turns": bench_turns,
+    }
+    if args.only:
+        benchmarks = {name: benchmarks[name] for name in args.only.split(",")}
+
+    results = run_suite(benchmarks, args.repeat)
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "faiss": faiss.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+        },
+        "results": results,
+    }
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Updated baseline {baseline_path}")
+    elif baseline_path.exists():
+        with open(baseline_path) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        print(f"No baseline at {baseline_path}; run with --update-baseline")
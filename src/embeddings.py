@@ -0,0 +1,396 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from lazy import lazy_import
+
+# Loaded on first use, so importing this module does not pay for them
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
+
+
+class EmbeddingModel:
+    """A loaded sentence embedding model shared by every agent that uses it."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+        start = time.perf_counter()
+        self.tokenizer = transformers.AutoTokenizer.from_pretrained(model_name)
+        self.model = transformers.AutoModel.from_pretrained(model_name)
+        self.model.eval()
+        self.load_time = time.perf_counter() - start
+
+        self.embedding_dim = self.model.config.hidden_size
+        # Fast tokenizers are not safe to call from several threads at once
+        self._tokenizer_lock = threading.Lock()
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes held by the model's parameters and buffers."""
+        tensors = list(self.model.parameters()) + list(self.model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Generate one mean-pooled embedding per input text."""
+        with self._tokenizer_lock:
+            inputs = self.tokenizer(
+                texts, return_tensors="pt", padding=True, truncation=True
+            )
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+
+        # Mean pooling over real tokens only, so padding does not skew the result
+        mask = inputs["attention_mask"].unsqueeze(-1).to(outputs.last_hidden_state)
+        summed = (outputs.last_hidden_state * mask).sum(dim=1)
+        embeddings = summed / mask.sum(dim=1).clamp(min=1)
+        return embeddings.numpy()
+
+    def embed(self, text: str) -> np.ndarray:
+        """Generate the embedding for a single text."""
+        return self.embed_batch([text])[0]
+
+
+class EmbeddingCache:
+    """LRU cache of embeddings keyed by model name and a hash of the text.
+
+    The in-memory tier is capped at `max_bytes`. When `cache_dir` is given,
+    every embedding is also written there as a `.npy` file so later sessions
+    and processes can reuse it; once those files exceed `max_disk_bytes` the
+    least recently used ones are deleted.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        cache_dir: str = None,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+    ):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.current_bytes = 0
+        self.disk_bytes = 0
+
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        # File sizes in least to most recently used order; hits touch the
+        # file so the order survives restarts
+        self._disk_entries: "OrderedDict[Path, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            paths = sorted(self.cache_dir.glob("*/*.npy"), key=os.path.getmtime)
+            for path in paths:
+                size = path.stat().st_size
+                self._disk_entries[path] = size
+                self.disk_bytes += size
+
+    @staticmethod
+    def _hash_text(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, model_name: str, text_hash: str) -> Path:
+        model_dir = model_name.replace("/", "__")
+        return self.cache_dir / model_dir / f"{text_hash}.npy"
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for `text`, or None on a miss."""
+        key = (model_name, self._hash_text(text))
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+        if self.cache_dir is not None:
+            path = self._disk_path(*key)
+            try:
+                embedding = np.load(path)
+                os.utime(path)
+            except (OSError, ValueError):
+                embedding = None
+            if embedding is not None:
+                embedding = self._store(key, embedding)
+                with self._lock:
+                    self.disk_hits += 1
+                    if path in self._disk_entries:
+                        self._disk_entries.move_to_end(path)
+                return embedding
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model_name: str, text: str, embedding: np.ndarray) -> np.ndarray:
+        """Cache an embedding in memory and, if configured, on disk."""
+        key = (model_name, self._hash_text(text))
+        embedding = self._store(key, embedding)
+
+        if self.cache_dir is not None:
+            path = self._disk_path(*key)
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # Write to a temp file first so readers never see a partial file
+                tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+                try:
+                    with open(tmp_path, "wb") as f:
+                        np.save(f, embedding)
+                    os.replace(tmp_path, path)
+                except OSError:
+                    tmp_path.unlink(missing_ok=True)
+                    raise
+                self._track_disk(path, path.stat().st_size)
+        return embedding
+
+    def _track_disk(self, path: Path, size: int):
+        """Record a written file and evict least recently used ones over budget."""
+        with self._lock:
+            self.disk_bytes += size - self._disk_entries.pop(path, 0)
+            self._disk_entries[path] = size
+            while self.disk_bytes > self.max_disk_bytes and len(self._disk_entries) > 1:
+                evicted, evicted_size = self._disk_entries.popitem(last=False)
+                self.disk_bytes -= evicted_size
+                try:
+                    os.remove(evicted)
+                except FileNotFoundError:
+                    pass
+
+    def _store(self, key: Tuple[str, str], embedding: np.ndarray) -> np.ndarray:
+        # Cached arrays are shared between callers, so keep them immutable
+        embedding = np.array(embedding, dtype="float32")
+        embedding.setflags(write=False)
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous.nbytes
+            self._entries[key] = embedding
+            self.current_bytes += embedding.nbytes
+
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+        return embedding
+
+    def get_stats(self) -> Dict[str, float]:
+        """Report hit/miss counters and current size."""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / max(lookups, 1),
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "disk_entries": len(self._disk_entries),
+            "disk_bytes": self.disk_bytes,
+        }
+
+
+class EmbeddingEngine:
+    """Coalesces embedding requests from many callers into padded batches.
+
+    Callers block on `embed` (or keep the future from `submit`) while a single
+    worker thread gathers whatever requests arrive within `max_wait` seconds,
+    runs them through the model as one batch and hands each caller its row.
+    """
+
+    def __init__(
+        self,
+        model: EmbeddingModel,
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+        cache: EmbeddingCache = None,
+    ):
+        self.model = model
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.request_count = 0
+        self.batch_count = 0
+
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._run,
+            name=f"embedding-engine-{model.model_name}",
+            daemon=True,
+        )
+        self._worker.start()
+
+    @property
+    def embedding_dim(self) -> int:
+        return self.model.embedding_dim
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for embedding and return a future for its vector."""
+        future = Future()
+        if self.cache is not None:
+            embedding = self.cache.get(self.model.model_name, text)
+            if embedding is not None:
+                future.set_result(embedding)
+                return future
+
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> np.ndarray:
+        """Generate the embedding for a single text, batched with other callers."""
+        return self.submit(text).result()
+
+    def _collect_batch(self) -> List[Tuple[str, Future]]:
+        """Block for one request, then gather more until the window closes."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Drop requests whose caller has already given up, e.g. a simulation
+            # stopped mid-turn; the rest can no longer be cancelled
+            batch = [
+                (text, future)
+                for text, future in self._collect_batch()
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+
+            # One bad batch must never take down the worker every session shares
+            try:
+                self._embed_batch(batch)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _embed_batch(self, batch: List[Tuple[str, Future]]):
+        # Identical texts in the same window share a single forward pass;
+        # sorting by length keeps padding waste low
+        waiters: Dict[str, List[Future]] = {}
+        for text, future in batch:
+            waiters.setdefault(text, []).append(future)
+        texts = sorted(waiters, key=len)
+
+        embeddings = self.model.embed_batch(texts)
+
+        self.request_count += len(batch)
+        self.batch_count += 1
+        for text, embedding in zip(texts, embeddings):
+            if self.cache is not None:
+                # A full or unwritable cache dir must not cost callers the vector
+                try:
+                    embedding = self.cache.put(self.model.model_name, text, embedding)
+                except OSError as e:
+                    print(f"Could not cache embedding: {str(e)}")
+            for future in waiters[text]:
+                future.set_result(embedding)
+
+    def get_stats(self) -> Dict[str, float]:
+        """Report how well requests are being coalesced."""
+        return {
+            "requests": self.request_count,
+            "batches": self.batch_count,
+            "mean_batch_size": self.request_count / max(self.batch_count, 1),
+            "queued": self._queue.qsize(),
+        }
+
+
+class EmbeddingService:
+    """Process-wide pool that loads each embedding model exactly once."""
+
+    _models: Dict[str, EmbeddingModel] = {}
+    _lock = threading.Lock()
+    _model_locks: Dict[str, threading.Lock] = {}
+    _engines: Dict[str, EmbeddingEngine] = {}
+    _cache: Optional[EmbeddingCache] = None
+
+    @classmethod
+    def get_cache(cls) -> EmbeddingCache:
+        """Return the cache shared by all engines, configured from the environment."""
+        with cls._lock:
+            if cls._cache is None:
+                cls._cache = EmbeddingCache(
+                    max_bytes=int(
+                        os.getenv("EMBEDDING_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+                    ),
+                    cache_dir=os.getenv("EMBEDDING_CACHE_DIR"),
+                    max_disk_bytes=int(
+                        os.getenv("EMBEDDING_CACHE_MAX_DISK_BYTES", 1024 * 1024 * 1024)
+                    ),
+                )
+            return cls._cache
+
+    @classmethod
+    def get_model(cls, model_name: str) -> EmbeddingModel:
+        """Return the shared model for `model_name`, loading it on first use."""
+        model = cls._models.get(model_name)
+        if model is not None:
+            return model
+
+        # Per-model lock so loading one model does not block lookups of another
+        with cls._lock:
+            model_lock = cls._model_locks.setdefault(model_name, threading.Lock())
+        with model_lock:
+            if model_name not in cls._models:
+                cls._models[model_name] = EmbeddingModel(model_name)
+            return cls._models[model_name]
+
+    @classmethod
+    def get_engine(cls, model_name: str) -> EmbeddingEngine:
+        """Return the shared batching engine for `model_name`."""
+        engine = cls._engines.get(model_name)
+        if engine is not None:
+            return engine
+
+        model = cls.get_model(model_name)
+        cache = cls.get_cache()
+        with cls._lock:
+            if model_name not in cls._engines:
+                cls._engines[model_name] = EmbeddingEngine(model, cache=cache)
+            return cls._engines[model_name]
+
+    @classmethod
+    def loaded_models(cls) -> List[str]:
+        """Get the names of all models loaded so far."""
+        return list(cls._models.keys())
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Dict]:
+        """Report load time, memory footprint, batching and cache usage."""
+        models = {}
+        for name, model in list(cls._models.items()):
+            models[name] = {
+                "load_time_seconds": model.load_time,
+                "memory_bytes": model.memory_bytes,
+                "embedding_dim": model.embedding_dim,
+            }
+            engine = cls._engines.get(name)
+            if engine is not None:
+                models[name]["engine"] = engine.get_stats()
+
+        stats = {"models": models}
+        if cls._cache is not None:
+            stats["cache"] = cls._cache.get_stats()
+        return stats
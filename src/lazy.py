@@ -0,0 +1,42 @@
+from types import ModuleType
+import importlib
+import importlib.util
+import sys
+
+
+class _MissingModule(ModuleType):
+    def __getattr__(self, attr: str):
+        raise ModuleNotFoundError(
+            f"No module named {self.__name__!r}", name=self.__name__
+        )
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Import a module whose code only runs on first attribute access.
+
+    Heavy dependencies (faiss, torch, transformers) are imported this way so
+    that importing our modules stays cheap and scripts that never touch them
+    never pay for loading them.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        # Report a missing dependency where it is used, not where it is imported
+        return _MissingModule(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def load(name: str) -> ModuleType:
+    """Import `name` now, finishing a pending lazy import if there is one."""
+    module = importlib.import_module(name)
+    # Any attribute access runs the code of a lazily imported module
+    getattr(module, "__dict__")
+    return module
@@ -0,0 +1,562 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from logger import load_log
+from metrics import Metrics
+
+
+class LLMError(Exception):
+    """Raised when a completion fails after all retries."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate` per second.
+
+    `reserve` takes tokens immediately and returns how long the caller must
+    wait before using them, so the same bucket serves sync and async callers.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # Requests larger than the bucket are let through once it is full
+            self._tokens -= min(tokens, self.capacity)
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class LLMBackend(ABC):
+    """Interface for chat completion backends.
+
+    Streaming is requested by passing `on_token`, which receives each token
+    as it arrives; the full response text is returned either way.
+    """
+
+    @abstractmethod
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 150,
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """Return the response text, streaming tokens to `on_token` if given."""
+
+    @abstractmethod
+    def complete_sync(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 150,
+    ) -> str:
+        """Blocking variant of `complete` for synchronous callers."""
+
+    def get_stats(self) -> Dict[str, float]:
+        return {}
+
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI chat completions over pooled HTTP connections.
+
+    Every request passes through request and token rate limits, has a
+    per-request timeout and is retried with exponential backoff and jitter
+    on rate limits, timeouts, connection errors and server errors, honouring
+    the server's `retry-after` hint when one is given.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_connections: int = 100,
+        timeout: float = 30.0,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 200_000,
+    ):
+        import httpx
+        import openai
+
+        self._openai = openai
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+        # Retries are handled here so rate limiting and stats see every attempt
+        self._client = openai.OpenAI(
+            api_key=api_key,
+            timeout=timeout,
+            max_retries=0,
+            http_client=httpx.Client(limits=limits),
+        )
+        self._async_client = openai.AsyncOpenAI(
+            api_key=api_key,
+            timeout=timeout,
+            max_retries=0,
+            http_client=httpx.AsyncClient(limits=limits),
+        )
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._request_bucket = TokenBucket(
+            requests_per_minute / 60, max(1.0, requests_per_minute / 60)
+        )
+        self._token_bucket = TokenBucket(
+            tokens_per_minute / 60, max(1.0, tokens_per_minute / 60)
+        )
+        self._retryable = (
+            openai.RateLimitError,
+            openai.APITimeoutError,
+            openai.APIConnectionError,
+            openai.InternalServerError,
+        )
+        self._stats = {"requests": 0, "retries": 0, "failures": 0, "throttled": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str, value: float = 1):
+        with self._stats_lock:
+            self._stats[key] += value
+        unit = "seconds_total" if key == "throttled" else "total"
+        Metrics.increment(f"llm_{key}_{unit}", value)
+
+    def _throttle_delay(self, messages: List[Dict[str, str]], max_tokens: int) -> float:
+        """Reserve rate-limit capacity and return how long to wait for it."""
+        estimated_tokens = sum(len(m["content"]) for m in messages) // 4 + max_tokens
+        delay = max(
+            self._request_bucket.reserve(1),
+            self._token_bucket.reserve(estimated_tokens),
+        )
+        if delay:
+            self._count("throttled", delay)
+        return delay
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        delay = min(self.backoff_max, self.backoff_base * 2**attempt)
+        return random.uniform(0, delay)
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 150,
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(self._throttle_delay(messages, max_tokens))
+            self._count("requests")
+            streamed = False
+            try:
+                response = await self._async_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=on_token is not None,
+                )
+                if on_token is None:
+                    return response.choices[0].message.content
+
+                tokens = []
+                async for chunk in response:
+                    if not chunk.choices:
+                        continue
+                    token = chunk.choices[0].delta.content
+                    if token:
+                        streamed = True
+                        tokens.append(token)
+                        on_token(token)
+                return "".join(tokens)
+            except self._retryable as e:
+                # A partly streamed response cannot be retried transparently
+                if streamed or attempt == self.max_retries:
+                    self._count("failures")
+                    raise LLMError(str(e)) from e
+                self._count("retries")
+                await asyncio.sleep(self._backoff_delay(attempt, e))
+            except self._openai.OpenAIError as e:
+                self._count("failures")
+                raise LLMError(str(e)) from e
+
+    def complete_sync(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 150,
+    ) -> str:
+        for attempt in range(self.max_retries + 1):
+            time.sleep(self._throttle_delay(messages, max_tokens))
+            self._count("requests")
+            try:
+                response = self._client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                )
+                return response.choices[0].message.content
+            except self._retryable as e:
+                if attempt == self.max_retries:
+                    self._count("failures")
+                    raise LLMError(str(e)) from e
+                self._count("retries")
+                time.sleep(self._backoff_delay(attempt, e))
+            except self._openai.OpenAIError as e:
+                self._count("failures")
+                raise LLMError(str(e)) from e
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+STUB_WORDS = (
+    "that reminds me of something I saw while travelling and I think the "
+    "interesting part is how people adapt when the tools around them change "
+    "so quickly but honestly what matters most is the story behind it"
+).split()
+
+
+class StubBackend(LLMBackend):
+    """Deterministic offline backend for load tests and benchmarks.
+
+    The response is derived from a hash of the prompt, so the same messages
+    always produce the same reply. `latency` is the time to the first token
+    and `token_latency` the delay between streamed tokens.
+    """
+
+    def __init__(
+        self, latency: float = 1.0, token_latency: float = 0.0, words: int = 24
+    ):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.words = words
+        self._requests = 0
+
+    def _respond(self, messages: List[Dict[str, str]]) -> List[str]:
+        self._requests += 1
+        digest = hashlib.sha1(
+            "\n".join(m["content"] for m in messages).encode("utf-8")
+        ).digest()
+        rng = random.Random(digest)
+        words = [rng.choice(STUB_WORDS) for _ in range(self.words)]
+        words[0] = words[0].capitalize()
+        return [words[0]] + [f" {word}" for word in words[1:]] + ["."]
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 150,
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        tokens = self._respond(messages)
+        await asyncio.sleep(self.latency)
+        if on_token is not None:
+            for i, token in enumerate(tokens):
+                if i and self.token_latency:
+                    await asyncio.sleep(self.token_latency)
+                on_token(token)
+        return "".join(tokens)
+
+    def complete_sync(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 150,
+    ) -> str:
+        tokens = self._respond(messages)
+        time.sleep(self.latency + self.token_latency * (len(tokens) - 1))
+        return "".join(tokens)
+
+    def get_stats(self) -> Dict[str, float]:
+        return {"requests": self._requests}
+
+
+class CompletionCache:
+    """Content-addressed completion cache stored on disk.
+
+    Keys hash the model, messages and sampling parameters, so identical
+    requests share an entry. Each entry is a small JSON file; once the cache
+    exceeds `max_bytes` the least recently used entries are deleted.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.current_bytes = 0
+
+        # Entry sizes in least to most recently used order; hits touch the
+        # file so the order survives restarts
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        paths = sorted(self.cache_dir.glob("*/*.json"), key=os.path.getmtime)
+        for path in paths:
+            size = path.stat().st_size
+            self._entries[path.stem] = size
+            self.current_bytes += size
+
+    @staticmethod
+    def make_key(
+        model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int
+    ) -> str:
+        payload = json.dumps(
+            [model, messages, temperature, max_tokens],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                response = json.load(f)["response"]
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return response
+
+    def put(self, key: str, response: str):
+        """Store a response and evict least recently used entries if needed."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps({"response": response}, ensure_ascii=False).encode("utf-8")
+        # Write to a temp file first so readers never see a partial entry
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.current_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                evicted, size = self._entries.popitem(last=False)
+                self.current_bytes -= size
+                try:
+                    os.remove(self._path(evicted))
+                except FileNotFoundError:
+                    pass
+
+    def get_stats(self) -> Dict[str, float]:
+        """Report hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / max(lookups, 1),
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+        }
+
+
+class CachedBackend(LLMBackend):
+    """Serves repeated requests from a CompletionCache, calling `backend` on misses.
+
+    Cached responses are streamed to `on_token` as a single token.
+    """
+
+    def __init__(self, backend: LLMBackend, cache: CompletionCache):
+        self.backend = backend
+        self.cache = cache
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 150,
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        key = self.cache.make_key(model, messages, temperature, max_tokens)
+        response = self.cache.get(key)
+        if response is not None:
+            if on_token is not None:
+                on_token(response)
+            return response
+
+        response = await self.backend.complete(
+            messages, model, temperature, max_tokens, on_token=on_token
+        )
+        self.cache.put(key, response)
+        return response
+
+    def complete_sync(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 150,
+    ) -> str:
+        key = self.cache.make_key(model, messages, temperature, max_tokens)
+        response = self.cache.get(key)
+        if response is None:
+            response = self.backend.complete_sync(
+                messages, model, temperature, max_tokens
+            )
+            self.cache.put(key, response)
+        return response
+
+    def get_stats(self) -> Dict[str, float]:
+        return {**self.backend.get_stats(), "cache": self.cache.get_stats()}
+
+
+class ReplayBackend(LLMBackend):
+    """Returns recorded responses in order instead of calling a model.
+
+    Used to rebuild a logged run offline; see `from_log`.
+    """
+
+    def __init__(self, responses: List[str]):
+        self._responses = deque(responses)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_log(cls, log_path: str, agent_name: str) -> "ReplayBackend":
+        """Replay one agent's responses from a conversation log in `logs/`."""
+        log = load_log(log_path)
+        return cls(
+            [
+                message["content"]
+                for message in log["messages"]
+                if message["type"] == "response" and message["agent"] == agent_name
+            ]
+        )
+
+    @property
+    def remaining(self) -> int:
+        return len(self._responses)
+
+    def _next(self) -> str:
+        with self._lock:
+            if not self._responses:
+                raise LLMError("Replay log has no more responses")
+            return self._responses.popleft()
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 150,
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        response = self._next()
+        if on_token is not None:
+            on_token(response)
+        return response
+
+    def complete_sync(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 150,
+    ) -> str:
+        return self._next()
+
+    def get_stats(self) -> Dict[str, float]:
+        return {"remaining": self.remaining}
+
+
+class LLMService:
+    """Process-wide LLM backend, shared so all agents use one connection pool."""
+
+    _backend: Optional[LLMBackend] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_backend(cls) -> LLMBackend:
+        """Return the shared backend, configured from the environment."""
+        with cls._lock:
+            if cls._backend is None:
+                cls._backend = cls._create_backend()
+            return cls._backend
+
+    @classmethod
+    def set_backend(cls, backend: LLMBackend):
+        """Replace the shared backend, e.g. with a StubBackend for offline runs."""
+        with cls._lock:
+            cls._backend = backend
+
+    @staticmethod
+    def _create_backend() -> LLMBackend:
+        # Read .env here rather than at import time, so importing is free of
+        # side effects; variables already set in the environment win
+        load_dotenv()
+        if os.getenv("LLM_BACKEND", "openai") == "stub":
+            backend = StubBackend(latency=float(os.getenv("LLM_STUB_LATENCY", 1.0)))
+        else:
+            backend = LLMService._create_openai_backend()
+
+        cache_dir = os.getenv("LLM_CACHE_DIR")
+        if cache_dir:
+            cache = CompletionCache(
+                cache_dir,
+                max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+            )
+            backend = CachedBackend(backend, cache)
+        return backend
+
+    @staticmethod
+    def _create_openai_backend() -> "OpenAIBackend":
+        return OpenAIBackend(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 100)),
+            timeout=float(os.getenv("LLM_TIMEOUT", 30.0)),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", 4)),
+            requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", 500)),
+            tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", 200_000)),
+        )
@@ -0,0 +1,123 @@
+"""Load test: how many simultaneous simulations can one process sustain?
+
+Runs increasing numbers of concurrent simulations through SimulationScheduler
+with real agents (embeddings, memory, prompt building) and the offline stub
+LLM backend, and reports throughput and response latency at each level. A
+level counts as sustained while its p95 response latency stays within
+`--max-slowdown` times the single-session latency. `--participants` sets
+the number of agents in each simulation.
+
+Usage:
+    python src/load_test.py [--levels 1,8,32,64,128] [--duration 30] [--llm-latency 1.0]
+        [--token-latency 0.0] [--participants 2]
+"""
+
+import argparse
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import yaml
+
+from agent import ConversationAgent
+from llm import StubBackend
+from scheduler import SimulationScheduler
+
+CONFIG_DIR = Path(__file__).parent / "config"
+
+
+class LatencyRecorder:
+    """Collects per-response latency from the scheduler's emitted events."""
+
+    def __init__(self):
+        self.thinking_since: Dict[str, float] = {}
+        self.latencies: List[float] = []
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, data: Dict, session_id: str):
+        now = time.perf_counter()
+        with self._lock:
+            if data.get("type") == "thinking":
+                self.thinking_since[session_id] = now
+            elif data.get("type") == "response":
+                self.latencies.append(now - self.thinking_since.pop(session_id))
+
+
+def run_level(
+    sessions: int, duration: float, backend: StubBackend, participants: int = 2
+) -> Dict[str, float]:
+    recorder = LatencyRecorder()
+    scheduler = SimulationScheduler(
+        emit=recorder.emit, max_concurrent_sessions=sessions, turn_delay=0.0
+    )
+    with open(CONFIG_DIR / "agents.yaml", "r") as f:
+        agents = yaml.safe_load(f)["agents"]
+    with open(CONFIG_DIR / "topics.yaml", "r") as f:
+        topics = yaml.safe_load(f)["topics"]
+    agent_ids = list(agents.keys())
+
+    simulations = []
+    for i in range(sessions):
+        simulation = {
+            "agents": [
+                ConversationAgent(
+                    personality=agents[agent_ids[j % len(agent_ids)]],
+                    llm_backend=backend,
+                )
+                for j in range(participants)
+            ],
+            "current_message": topics[i % len(topics)],
+            "turn": 0,
+            "is_active": True,
+        }
+        simulations.append(simulation)
+        scheduler.start_simulation(f"load-{i}", simulation)
+
+    time.sleep(duration)
+    for i, simulation in enumerate(simulations):
+        simulation["is_active"] = False
+        scheduler.stop_simulation(f"load-{i}")
+    # Each level gets a fresh loop thread; release it before the next one
+    scheduler.shutdown()
+
+    latencies = np.array(recorder.latencies)
+    return {
+        "sessions": sessions,
+        "responses_per_second": len(latencies) / duration,
+        "p50_latency": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        "p95_latency": float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", default="1,8,32,64,128")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--max-slowdown", type=float, default=1.5)
+    parser.add_argument("--participants", type=int, default=2)
+    args = parser.parse_args()
+
+    backend = StubBackend(latency=args.llm_latency, token_latency=args.token_latency)
+    levels = [int(level) for level in args.levels.split(",")]
+
+    print(f"{'sessions':>9} {'resp/s':>8} {'p50 s':>7} {'p95 s':>7}  sustained")
+    baseline = None
+    max_sustained = 0
+    for level in levels:
+        result = run_level(level, args.duration, backend, args.participants)
+        if baseline is None:
+            baseline = result["p95_latency"]
+        sustained = result["p95_latency"] <= baseline * args.max_slowdown
+        if sustained:
+            max_sustained = level
+        print(
+            f"{level:>9} {result['responses_per_second']:>8.1f} "
+            f"{result['p50_latency']:>7.2f} {result['p95_latency']:>7.2f}  "
+            f"{'yes' if sustained else 'no'}"
+        )
+
+    print(f"Max sustained simultaneous simulations: {max_sustained}")
@@ -1,26 +1,100 @@
 from datetime import datetime
 import json
+import queue
+import threading
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
+
+
+def load_log(log_file) -> Dict:
+    """Read a conversation log into a single dict.
+
+    Streaming `.jsonl` logs are folded back into the layout of the older
+    `.json` logs (session metadata, `messages`, `end_time` and `summaries`),
+    which are returned as they are. A log whose session never ended has no
+    `end_time`.
+    """
+    log_file = Path(log_file)
+    with open(log_file, "r", encoding="utf-8") as f:
+        if log_file.suffix == ".json":
+            return json.load(f)
+        lines = f.readlines()
+
+    conversation_data = {"messages": []}
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # A crash can leave a partial last line
+            continue
+        record_type = record.pop("type")
+        if record_type in ("session_start", "session_end"):
+            conversation_data.update(record)
+        else:
+            conversation_data["messages"].append({"type": record_type, **record})
+    return conversation_data
 
 
 class ConversationLogger:
-    def __init__(self, session_id, agent1_name, agent2_name, topic):
+    """Streams a conversation to an append-only JSONL log.
+
+    The first line holds the session metadata, each message is one line, and
+    a final line holds the end time and summaries. Lines are buffered and
+    flushed every `flush_every` messages or `flush_interval` seconds, so a
+    crash loses at most one flush window. With `background=True` writes
+    happen on a writer thread instead of the caller's. Group conversations
+    list every agent in `participants`; `agent1` and `agent2` are the first two.
+    """
+
+    def __init__(
+        self,
+        session_id,
+        agent1_name,
+        agent2_name,
+        topic,
+        flush_every: int = 20,
+        flush_interval: float = 5.0,
+        background: bool = False,
+        participants: Optional[List[str]] = None,
+    ):
         self.logs_dir = Path(__file__).parent.parent / "logs"
         self.logs_dir.mkdir(exist_ok=True)
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"conversation_{timestamp}_{session_id}.json"
+        filename = f"conversation_{timestamp}_{session_id}.jsonl"
         self.log_file = self.logs_dir / filename
 
-        self.conversation_data = {
+        self.agent1_name = agent1_name
+        self.agent2_name = agent2_name
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.closed = False
+
+        self._file = open(self.log_file, "a", encoding="utf-8")
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._writer: Optional[threading.Thread] = None
+        if background:
+            self._queue = queue.Queue()
+            self._writer = threading.Thread(
+                target=self._write_loop, name=f"log-writer-{session_id}", daemon=True
+            )
+            self._writer.start()
+
+        session_start = {
+            "type": "session_start",
             "session_id": session_id,
             "start_time": datetime.now().isoformat(),
             "agent1": agent1_name,
             "agent2": agent2_name,
             "topic": topic,
-            "messages": [],
         }
+        if participants:
+            session_start["participants"] = list(participants)
+        self._append(session_start)
 
     def log_message(
         self,
@@ -29,8 +103,9 @@ class ConversationLogger:
         content: Optional[str] = None,
         move: Optional[str] = None,
         move_description: Optional[str] = None,
+        metrics: Optional[Dict[str, float]] = None,
     ):
-        """Add a message to the conversation log (does not save to file)."""
+        """Append a message to the conversation log."""
         message_entry = {
             "timestamp": datetime.now().isoformat(),
             "type": message_type,
@@ -41,28 +116,86 @@ class ConversationLogger:
         if move and move_description:
             message_entry.update({"move": move, "move_description": move_description})
 
-        self.conversation_data["messages"].append(message_entry)
+        if metrics:
+            message_entry["metrics"] = metrics
+
+        self._append(message_entry)
+
+    def _append(self, record: Dict):
+        if self.closed:
+            return
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        if self._queue is not None:
+            self._queue.put(line)
+        else:
+            self._write(line)
+
+    def _write(self, line: str):
+        with self._lock:
+            self._file.write(line)
+            self._pending += 1
+            if (
+                self._pending >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            ):
+                self._flush()
+
+    def _flush(self):
+        self._file.flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def _write_loop(self):
+        while True:
+            try:
+                line = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # Flush a partial buffer once the session goes quiet
+                with self._lock:
+                    if self._pending:
+                        self._flush()
+                continue
+            if line is None:
+                self._queue.task_done()
+                return
+            self._write(line)
+            self._queue.task_done()
 
     def save_log(self):
-        """Explicitly save the log file."""
-        with open(self.log_file, "w", encoding="utf-8") as f:
-            json.dump(self.conversation_data, f, indent=2, ensure_ascii=False)
+        """Flush every message logged so far to the log file."""
+        if self.closed:
+            return
+        if self._queue is not None:
+            self._queue.join()
+        with self._lock:
+            self._flush()
 
     def end_conversation(
-        self, agent1_summary: Optional[str] = None, agent2_summary: Optional[str] = None
+        self,
+        agent1_summary: Optional[str] = None,
+        agent2_summary: Optional[str] = None,
+        summaries: Optional[Dict[str, str]] = None,
     ):
-        """End the conversation, add summaries if provided, and save the final log."""
-        self.conversation_data["end_time"] = datetime.now().isoformat()
-
-        if agent1_summary or agent2_summary:
-            self.conversation_data["summaries"] = {}
-            if agent1_summary:
-                self.conversation_data["summaries"][
-                    self.conversation_data["agent1"]
-                ] = agent1_summary
-            if agent2_summary:
-                self.conversation_data["summaries"][
-                    self.conversation_data["agent2"]
-                ] = agent2_summary
-
-        self.save_log()
+        """End the conversation, add summaries if provided, and close the log.
+
+        `summaries` maps agent names to summaries, for group conversations.
+        """
+        if self.closed:
+            return
+        end_record = {"type": "session_end", "end_time": datetime.now().isoformat()}
+
+        summaries = dict(summaries or {})
+        if agent1_summary:
+            summaries[self.agent1_name] = agent1_summary
+        if agent2_summary:
+            summaries[self.agent2_name] = agent2_summary
+        if summaries:
+            end_record["summaries"] = summaries
+
+        self._append(end_record)
+        if self._queue is not None:
+            self._queue.put(None)
+            self._writer.join()
+        with self._lock:
+            self._file.close()
+        self.closed = True
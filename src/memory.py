@@ -1,22 +1,294 @@
+from __future__ import annotations
+
 import numpy as np
-import faiss
-from typing import List, Dict, Tuple, Optional
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    List,
+    Dict,
+    Sequence,
+    Set,
+    Tuple,
+    Optional,
+    Union,
+)
+from collections import deque
+from concurrent.futures import Future
 from dataclasses import dataclass
 from datetime import datetime
+from itertools import islice
+from pathlib import Path
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+
+from lazy import lazy_import
+from metrics import Metrics
+
+# Loaded on first use, so importing this module does not pay for faiss
+faiss = lazy_import("faiss")
 
 
-@dataclass
 class Memory:
-    content: str
-    timestamp: datetime
-    importance: float
-    context: Dict[str, str]
+    """A single memory; the timestamp is kept as float POSIX seconds."""
+
+    __slots__ = ("content", "timestamp_seconds", "importance", "context")
+
+    def __init__(
+        self,
+        content: str,
+        timestamp: Union[datetime, float],
+        importance: float,
+        context: Dict[str, str],
+    ):
+        self.content = content
+        self.timestamp_seconds = (
+            timestamp.timestamp() if isinstance(timestamp, datetime) else timestamp
+        )
+        self.importance = importance
+        self.context = context
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.timestamp_seconds)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Memory):
+            return NotImplemented
+        return (
+            self.content == other.content
+            and self.timestamp_seconds == other.timestamp_seconds
+            and self.importance == other.importance
+            and self.context == other.context
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"Memory(content={self.content!r}, timestamp={self.timestamp!r}, "
+            f"importance={self.importance!r}, context={self.context!r})"
+        )
+
+
+class ContextTable:
+    """Interns context dicts so that identical contexts are stored once.
+
+    Keys and string values are interned too. Returned dicts are shared
+    between memories and must not be mutated.
+    """
+
+    def __init__(self):
+        self.contexts: List[Dict[str, Any]] = []
+        self._ids: Dict[Tuple, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.contexts)
+
+    def intern(self, context: Dict[str, Any]) -> int:
+        """Get the id of a context, adding it if it has not been seen."""
+        try:
+            key = tuple(sorted(context.items()))
+            context_id = self._ids.get(key)
+        except TypeError:
+            # Unhashable values cannot be deduplicated
+            key, context_id = None, None
+        if context_id is not None:
+            return context_id
+
+        context_id = len(self.contexts)
+        self.contexts.append(
+            {
+                sys.intern(k): sys.intern(v) if isinstance(v, str) else v
+                for k, v in context.items()
+            }
+        )
+        if key is not None:
+            self._ids[key] = context_id
+        return context_id
+
+
+class MemoryColumns(Sequence):
+    """Columnar memory storage that exposes each row as a `Memory` view.
+
+    Timestamps and importance live in growable NumPy arrays and contexts are
+    interned in a `ContextTable`, so a stored memory costs its content string
+    plus a few bytes instead of a full object with its own dict and datetime.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        capacity = max(initial_capacity, 1)
+        self.contents: List[str] = []
+        self.context_table = ContextTable()
+        self._timestamps = np.empty(capacity, dtype="float64")
+        self._importance = np.empty(capacity, dtype="float64")
+        self._context_ids = np.empty(capacity, dtype="int32")
+
+    def __len__(self) -> int:
+        return len(self.contents)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps[: len(self)]
+
+    @property
+    def importance(self) -> np.ndarray:
+        return self._importance[: len(self)]
+
+    @property
+    def context_ids(self) -> np.ndarray:
+        return self._context_ids[: len(self)]
+
+    def append(
+        self,
+        content: str,
+        timestamp: float,
+        importance: float,
+        context: Dict[str, Any],
+    ):
+        size = len(self)
+        if size == len(self._timestamps):
+            new_capacity = size * 2
+            self._timestamps = np.resize(self._timestamps, new_capacity)
+            self._importance = np.resize(self._importance, new_capacity)
+            self._context_ids = np.resize(self._context_ids, new_capacity)
+
+        self._timestamps[size] = timestamp
+        self._importance[size] = importance
+        self._context_ids[size] = self.context_table.intern(context)
+        self.contents.append(content)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("memory index out of range")
+        return Memory(
+            content=self.contents[index],
+            timestamp=float(self._timestamps[index]),
+            importance=float(self._importance[index]),
+            context=self.context_table.contexts[self._context_ids[index]],
+        )
+
+    def copy(self) -> List[Memory]:
+        return list(self)
+
+    def filter_mask(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Boolean mask of the memories whose context matches every filter."""
+        # Filters are evaluated once per distinct context, then broadcast
+        matching = np.fromiter(
+            (
+                all(
+                    _matches_filter(context.get(key), condition)
+                    for key, condition in filters.items()
+                )
+                for context in self.context_table.contexts
+            ),
+            dtype=bool,
+            count=len(self.context_table),
+        )
+        return matching[self.context_ids]
+
+
+def _matches_filter(value: Any, condition: Any) -> bool:
+    if callable(condition):
+        return bool(condition(value))
+    if isinstance(condition, (list, tuple, set, frozenset)):
+        return value in condition
+    return value == condition
+
+
+class ImportanceEviction:
+    """Evicts the least important memory, oldest first among equals.
+
+    A deque keeps memories in arrival order for O(k) recent retrieval and a
+    heap keyed on (importance, arrival) gives O(log n) eviction. Evicted
+    memories are dropped from the deque lazily.
+    """
+
+    def __init__(self):
+        self._recent: Deque[Tuple[int, Memory]] = deque()
+        self._heap: List[Tuple[float, int, Memory]] = []
+        self._evicted: Set[int] = set()
+        self._next_seq = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def add(self, memory: Memory):
+        seq = self._next_seq
+        self._next_seq += 1
+        self._recent.append((seq, memory))
+        heapq.heappush(self._heap, (memory.importance, seq, memory))
+
+    def evict(self) -> Memory:
+        _, seq, memory = heapq.heappop(self._heap)
+        self._evicted.add(seq)
+
+        # Trim evicted entries off the old end, and compact once they dominate
+        while self._recent and self._recent[0][0] in self._evicted:
+            self._evicted.remove(self._recent.popleft()[0])
+        if len(self._evicted) > len(self._heap):
+            self._recent = deque(
+                entry for entry in self._recent if entry[0] not in self._evicted
+            )
+            self._evicted.clear()
+        return memory
+
+    def recent(self, n: int) -> List[Memory]:
+        """Get up to `n` memories, newest first."""
+        result = []
+        for seq, memory in reversed(self._recent):
+            if len(result) >= n:
+                break
+            if seq not in self._evicted:
+                result.append(memory)
+        return result
+
+    def memories(self) -> List[Memory]:
+        """Get all memories in arrival order."""
+        return [memory for seq, memory in self._recent if seq not in self._evicted]
+
+
+class RecencyEviction:
+    """Evicts the oldest memory regardless of importance."""
+
+    def __init__(self):
+        self._recent: Deque[Memory] = deque()
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    def add(self, memory: Memory):
+        self._recent.append(memory)
+
+    def evict(self) -> Memory:
+        return self._recent.popleft()
+
+    def recent(self, n: int) -> List[Memory]:
+        """Get up to `n` memories, newest first."""
+        return list(islice(reversed(self._recent), n))
+
+    def memories(self) -> List[Memory]:
+        """Get all memories in arrival order."""
+        return list(self._recent)
 
 
 class ShortTermMemory:
-    def __init__(self, capacity: int = 10):
+    def __init__(self, capacity: int = 10, eviction_policy=None):
         self.capacity = capacity
-        self.memories: List[Memory] = []
+        # Remove oldest memory with lowest importance unless told otherwise
+        self.eviction_policy = eviction_policy or ImportanceEviction()
+
+    @property
+    def memories(self) -> List[Memory]:
+        return self.eviction_policy.memories()
 
     def add_memory(
         self, content: str, importance: float = 1.0, context: Dict[str, str] = None
@@ -26,29 +298,195 @@ class ShortTermMemory:
 
         memory = Memory(
             content=content,
-            timestamp=datetime.now(),
+            timestamp=time.time(),
             importance=importance,
             context=context,
         )
 
-        self.memories.append(memory)
-        if len(self.memories) > self.capacity:
-            # Remove oldest memory with lowest importance
-            self.memories.sort(key=lambda x: (x.importance, x.timestamp))
-            self.memories.pop(0)
+        self.eviction_policy.add(memory)
+        if len(self.eviction_policy) > self.capacity:
+            self.eviction_policy.evict()
 
     def get_recent_memories(self, n: int = None) -> List[Memory]:
         if n is None:
             n = self.capacity
-        return sorted(self.memories, key=lambda x: x.timestamp, reverse=True)[:n]
+        return self.eviction_policy.recent(n)
+
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+# Minimum store size at which each index type takes over in "auto" mode
+AUTO_INDEX_TIERS = [(0, "flat"), (20_000, "hnsw"), (200_000, "ivfpq")]
+
+# Trained indexes need enough vectors to fit their centroids
+MIN_TRAINING_SIZE = {"ivf": 10_000, "ivfpq": 50_000}
+MAX_TRAINING_SIZE = 100_000
+
+
+def get_index_tiers(index_type: str) -> List[Tuple[int, str]]:
+    """Get the (minimum size, index type) tiers used for an index type setting."""
+    if index_type == "auto":
+        return AUTO_INDEX_TIERS
+    if index_type not in INDEX_TYPES:
+        raise ValueError(
+            f"Invalid index type: {index_type}. Valid types are: {INDEX_TYPES + ('auto',)}"
+        )
+    if index_type in MIN_TRAINING_SIZE:
+        # Exact search until there is enough data to train on
+        return [(0, "flat"), (MIN_TRAINING_SIZE[index_type], index_type)]
+    return [(0, index_type)]
+
+
+def get_index_type(index: faiss.Index) -> str:
+    """Get the index type name of a FAISS index."""
+    if isinstance(index, faiss.IndexHNSWFlat):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf"
+    return "flat"
+
+
+def build_index(index_type: str, embeddings: np.ndarray) -> faiss.Index:
+    """Build an index of the given type over `embeddings`, training it if needed."""
+    n, dim = embeddings.shape
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, 32)
+        index.hnsw.efConstruction = 80
+        index.hnsw.efSearch = 64
+    elif index_type in ("ivf", "ivfpq"):
+        # ~4 * sqrt(n) lists, with enough points per list to train k-means
+        nlist = int(max(min(4 * np.sqrt(n), n / 39, 65536), 1))
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            # Largest sub-quantizer count that divides the dimension while
+            # keeping at least 8 dimensions per sub-vector
+            subquantizers = next(
+                m
+                for m in (64, 48, 32, 24, 16, 8, 4, 2, 1)
+                if dim % m == 0 and dim // m >= 8 or m == 1
+            )
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, subquantizers, 8)
+        # Train on a sample; more data adds build time without better centroids
+        if n > MAX_TRAINING_SIZE:
+            sample = np.random.default_rng(0).choice(
+                n, MAX_TRAINING_SIZE, replace=False
+            )
+            index.train(embeddings[np.sort(sample)])
+        else:
+            index.train(embeddings)
+        index.nprobe = max(1, nlist // 16)
+    else:
+        raise ValueError(
+            f"Invalid index type: {index_type}. Valid types are: {INDEX_TYPES}"
+        )
+
+    if n:
+        index.add(embeddings)
+    return index
+
+
+@dataclass
+class RetrievalScoring:
+    """How long-term memory candidates are re-ranked after the index search."""
+
+    similarity_weight: float = 1.0
+    recency_weight: float = 0.0
+    importance_weight: float = 0.0
+    # Seconds after which a memory's recency score has halved
+    recency_half_life: float = 3600.0
+    # Candidates fetched from the index per result returned
+    overfetch: int = 4
+
+
+def _normalize_rows(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Min-max scale each row to [0, 1] over its valid entries."""
+    low = np.where(valid, values, np.inf).min(axis=1, keepdims=True)
+    high = np.where(valid, values, -np.inf).max(axis=1, keepdims=True)
+    span = high - low
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scaled = (values - low) / span
+    # Rows where every candidate is equal carry no ranking signal
+    return np.where(span > 0, scaled, 1.0)
+
+
+def score_candidates(
+    distances: np.ndarray,
+    indices: np.ndarray,
+    timestamps: np.ndarray,
+    importance: np.ndarray,
+    scoring: RetrievalScoring,
+    now: float,
+) -> np.ndarray:
+    """
+    Score index candidates (one row per query) with NumPy only.
+
+    Similarity (negated L2 distance) and importance are min-max normalized
+    per query. Recency is the absolute decay `2 ** (-age / half_life)`, so
+    memories a few seconds apart score almost the same and the half-life
+    sets how fast recency fades. The terms are mixed with the weights in
+    `scoring`. Padding entries (index -1) score -inf.
+    """
+    valid = indices >= 0
+    rows = np.where(valid, indices, 0)
+
+    similarity = _normalize_rows(-distances.astype("float64"), valid)
+    age = np.maximum(now - timestamps[rows], 0.0)
+    recency = np.exp2(-age / scoring.recency_half_life)
+    weight = _normalize_rows(importance[rows], valid)
+
+    scores = (
+        scoring.similarity_weight * similarity
+        + scoring.recency_weight * recency
+        + scoring.importance_weight * weight
+    )
+    return np.where(valid, scores, -np.inf)
 
 
 class LongTermMemory:
-    def __init__(self, embedding_dim: int = 768):
+    def __init__(
+        self,
+        embedding_dim: int = 768,
+        initial_capacity: int = 1024,
+        index_type: str = "flat",
+    ):
         self.embedding_dim = embedding_dim
         self.index = faiss.IndexFlatL2(embedding_dim)
-        self.memories: List[Memory] = []
-        self.embeddings: List[np.ndarray] = []
+        self.memories = MemoryColumns(initial_capacity)
+
+        # Index tiers are switched, and trained tiers retrained, in the background
+        self.index_tiers = get_index_tiers(index_type)
+        self.index_type = "flat"
+        self._trained_size = 0
+        self._index_lock = threading.Lock()
+        self._rebuild_thread: Optional[threading.Thread] = None
+
+        # Preallocated embedding matrix, grown geometrically as memories arrive
+        self._embeddings = np.empty(
+            (max(initial_capacity, 1), embedding_dim), dtype="float32"
+        )
+        self._size = 0
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """View of the stored embeddings, one row per memory."""
+        return self._embeddings[: self._size]
+
+    def _reserve(self, capacity: int):
+        """Grow the embedding matrix so it can hold at least `capacity` rows."""
+        if capacity <= self._embeddings.shape[0]:
+            return
+        new_capacity = max(capacity, self._embeddings.shape[0] * 2)
+        grown = np.empty((new_capacity, self.embedding_dim), dtype="float32")
+        grown[: self._size] = self._embeddings[: self._size]
+        self._embeddings = grown
 
     def add_memory(
         self,
@@ -56,41 +494,539 @@ class LongTermMemory:
         embedding: np.ndarray,
         importance: float = 1.0,
         context: Dict[str, str] = None,
+        timestamp: Optional[float] = None,
     ):
         if context is None:
             context = {}
+        if timestamp is None:
+            timestamp = time.time()
 
-        memory = Memory(
-            content=content,
-            timestamp=datetime.now(),
-            importance=importance,
-            context=context,
+        self._reserve(self._size + 1)
+        row = self._embeddings[self._size]
+        row[:] = np.asarray(embedding, dtype="float32").reshape(-1)
+        self._size += 1
+        self.memories.append(content, timestamp, importance, context)
+
+        # Append only the new vector instead of rebuilding the index
+        with self._index_lock:
+            self.index.add(row.reshape(1, -1))
+        Metrics.increment("memories_added_total")
+        self._maybe_rebuild_index()
+
+    def _target_index_type(self, size: int) -> str:
+        target = self.index_tiers[0][1]
+        for min_size, index_type in self.index_tiers:
+            if size >= min_size:
+                target = index_type
+        return target
+
+    def _maybe_rebuild_index(self):
+        """Start a background rebuild when the store outgrows its index."""
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            return
+
+        target = self._target_index_type(self._size)
+        stale = (
+            target in MIN_TRAINING_SIZE
+            and target == self.index_type
+            and self._size >= 2 * self._trained_size
+        )
+        if target == self.index_type and not stale:
+            return
+
+        # Rows below `_size` never change, so the builder can read them directly
+        self._rebuild_thread = threading.Thread(
+            target=self._rebuild_index,
+            args=(target, self._embeddings[: self._size]),
+            name="long-term-memory-index",
+            daemon=True,
         )
+        self._rebuild_thread.start()
 
-        self.memories.append(memory)
-        self.embeddings.append(embedding)
+    def _rebuild_index(self, index_type: str, embeddings: np.ndarray):
+        with Metrics.timer("index_rebuild", index_type=index_type):
+            index = build_index(index_type, embeddings)
+        Metrics.increment("index_rebuilds_total", index_type=index_type)
+        with self._index_lock:
+            # Catch up on memories added while the new index was being built
+            if self.index.ntotal > index.ntotal:
+                index.add(
+                    np.asarray(self._embeddings[index.ntotal : self.index.ntotal])
+                )
+            self.index = index
+            self.index_type = index_type
+            self._trained_size = len(embeddings)
 
-        if len(self.embeddings) > 1:
-            embeddings_array = np.array(self.embeddings).astype("float32")
-            self.index = faiss.IndexFlatL2(self.embedding_dim)
-            self.index.add(embeddings_array)
+    def wait_for_index(self):
+        """Block until any background index rebuild has finished."""
+        if self._rebuild_thread is not None:
+            self._rebuild_thread.join()
 
     def search_memories(
-        self, query_embedding: np.ndarray, k: int = 5
+        self,
+        query_embedding: np.ndarray,
+        k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        shared: Optional["SharedMemory"] = None,
     ) -> List[Tuple[Memory, float]]:
-        if not self.memories:
-            return []
+        return self.search_many(
+            query_embedding.reshape(1, -1), k=k, filters=filters, shared=shared
+        )[0]
+
+    def search_many(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        shared: Optional["SharedMemory"] = None,
+    ) -> List[List[Tuple[Memory, float]]]:
+        """
+        Search for several queries with a single index call.
 
-        distances, indices = self.index.search(
-            query_embedding.reshape(1, -1).astype("float32"), k
+        `query_embeddings` holds one query per row. `filters` restricts the
+        search to memories whose context matches every entry: a value is
+        compared for equality, a list/tuple/set for membership, and a callable
+        is used as a predicate. Filters are applied inside the index search, so
+        each query still gets up to `k` matching results. With `shared`, the
+        search runs over this store and that segment together.
+        """
+        distances, indices, resolve, _ = self._search_with(
+            shared, query_embeddings, k, filters
         )
-        results = []
 
-        for idx, distance in zip(indices[0], distances[0]):
-            if idx < len(self.memories):
-                results.append((self.memories[idx], float(distance)))
+        # FAISS pads with -1 when fewer than k memories match
+        return [
+            [
+                (resolve(idx), float(distance))
+                for idx, distance in zip(row_indices, row_distances)
+                if idx >= 0
+            ]
+            for row_indices, row_distances in zip(indices, distances)
+        ]
+
+    def retrieve(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 5,
+        scoring: Optional["RetrievalScoring"] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        shared: Optional["SharedMemory"] = None,
+    ) -> List[Tuple[Memory, float]]:
+        return self.retrieve_many(
+            query_embedding.reshape(1, -1),
+            k=k,
+            scoring=scoring,
+            filters=filters,
+            shared=shared,
+        )[0]
+
+    def retrieve_many(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 5,
+        scoring: Optional["RetrievalScoring"] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        shared: Optional["SharedMemory"] = None,
+    ) -> List[List[Tuple[Memory, float]]]:
+        """
+        Retrieve memories ranked by a mix of similarity, recency and importance.
+
+        Over-fetches `k * scoring.overfetch` candidates from the index and
+        re-ranks them with `score_candidates`. Returned scores are the weighted
+        sum of components that are each scaled to [0, 1]; higher is better.
+        """
+        if scoring is None:
+            scoring = RetrievalScoring()
+        if not len(self.memories) and (shared is None or not len(shared.memories)):
+            return [[] for _ in np.atleast_2d(query_embeddings)]
+
+        distances, indices, resolve, offset = self._search_with(
+            shared, query_embeddings, k * max(scoring.overfetch, 1), filters
+        )
+        timestamps = self.memories.timestamps
+        importance = self.memories.importance
+        if shared is not None:
+            # Shared rows are numbered from `offset`, so a memory added to this
+            # store since the search must not shift them
+            timestamps = np.concatenate(
+                [timestamps[:offset], shared.memories.timestamps]
+            )
+            importance = np.concatenate(
+                [importance[:offset], shared.memories.importance]
+            )
+        scores = score_candidates(
+            distances,
+            indices,
+            timestamps,
+            importance,
+            scoring,
+            now=time.time(),
+        )
+        top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
 
+        results = []
+        for row_indices, row_scores, row_top in zip(indices, scores, top):
+            results.append(
+                [
+                    (resolve(row_indices[i]), float(row_scores[i]))
+                    for i in row_top
+                    if np.isfinite(row_scores[i])
+                ]
+            )
         return results
 
+    def _search_with(
+        self,
+        shared: Optional["SharedMemory"],
+        query_embeddings: np.ndarray,
+        k: int,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, Callable[[int], Memory], int]:
+        """Search this store and, if given, `shared`, merging by distance.
+
+        Returns FAISS-style (distances, indices) where shared rows are
+        numbered from `offset`, a function mapping an index to its memory,
+        and `offset` itself.
+        """
+        distances, indices = self._search(query_embeddings, k, filters)
+        # Taken after searching: a memory is appended to the columns before
+        # the index, so every private result lies below it
+        offset = len(self.memories)
+        if shared is None:
+            return distances, indices, self.memories.__getitem__, offset
+
+        shared_distances, shared_indices = shared._search(query_embeddings, k, filters)
+        shared_indices = np.where(shared_indices >= 0, shared_indices + offset, -1)
+        distances = np.concatenate([distances, shared_distances], axis=1)
+        indices = np.concatenate([indices, shared_indices], axis=1)
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+
+        def resolve(idx: int) -> Memory:
+            if idx < offset:
+                return self.memories[idx]
+            return shared.memories[idx - offset]
+
+        return (
+            np.take_along_axis(distances, order, axis=1),
+            np.take_along_axis(indices, order, axis=1),
+            resolve,
+            offset,
+        )
+
+    def _search(
+        self,
+        query_embeddings: np.ndarray,
+        k: int,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Run one index search; returns FAISS-style (distances, indices)."""
+        queries = np.ascontiguousarray(np.atleast_2d(query_embeddings), dtype="float32")
+        empty = (
+            np.full((len(queries), k), np.inf, dtype="float32"),
+            np.full((len(queries), k), -1, dtype="int64"),
+        )
+        if not len(self.memories):
+            return empty
+
+        params = None
+        if filters:
+            mask = self.memories.filter_mask(filters)
+            if not mask.any():
+                return empty
+            # The bitmap must stay alive for as long as the selector is used
+            bitmap = np.packbits(mask, bitorder="little")
+            selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+
+        with self._index_lock, Metrics.timer(
+            "index_search", index_type=self.index_type
+        ):
+            if filters:
+                params = self._search_params(selector)
+            return self.index.search(queries, k, params=params)
+
+    def _search_params(self, selector: faiss.IDSelector) -> faiss.SearchParameters:
+        """Search parameters that apply `selector` and keep the index's settings."""
+        if isinstance(self.index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(
+                sel=selector, efSearch=self.index.hnsw.efSearch
+            )
+        if isinstance(self.index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.index.nprobe)
+        return faiss.SearchParameters(sel=selector)
+
     def get_all_memories(self) -> List[Memory]:
         return self.memories.copy()
+
+    def save(self):
+        """Persist the store; in-memory stores have nothing to save."""
+
+
+class SharedMemory(LongTermMemory):
+    """Conversation-level segment that stores the transcript once for everyone.
+
+    Each participant searches it together with its own long-term memory
+    (`search_memories(..., shared=segment)`), so a message heard by N agents
+    costs one vector and one index entry instead of N. Participants' own
+    stores hold no references to it; the union is formed at search time.
+
+    A row is one message, identified by its speaker, its text and how many
+    times that speaker has said that text before. Each participant stores
+    every message once, so a `writer` adding a speaker's text joins the
+    oldest such row it has not stored yet, and only adds a row when it has
+    stored them all: repeated utterances stay separate messages.
+    """
+
+    def __init__(
+        self,
+        embedding_dim: int = 768,
+        initial_capacity: int = 256,
+        index_type: str = "flat",
+    ):
+        super().__init__(embedding_dim, initial_capacity, index_type)
+        # (speaker, content) -> rows in the order they were said
+        self._messages: Dict[Tuple[Optional[str], str], List[int]] = {}
+        # Writers that have stored each row
+        self._writers: List[Set[Any]] = []
+        # content -> first row with that text, for reusing its vector
+        self._embedding_rows: Dict[str, int] = {}
+        # content -> vector still being computed by its speaker
+        self._pending_embeddings: Dict[str, Future] = {}
+        self._add_lock = threading.Lock()
+        # Rows already copied into each persistent store, by store
+        self._copied: Dict[int, int] = {}
+
+    def add_memory(
+        self,
+        content: str,
+        embedding: np.ndarray,
+        importance: float = 1.0,
+        context: Dict[str, str] = None,
+        timestamp: Optional[float] = None,
+        speaker: Optional[str] = None,
+        writer: Any = None,
+    ):
+        """Store a message said by `speaker`, unless `writer` has one to join."""
+        with self._add_lock:
+            rows = self._messages.setdefault((speaker, content), [])
+            for row in rows:
+                if writer not in self._writers[row]:
+                    self._writers[row].add(writer)
+                    return
+
+            if speaker is not None:
+                context = {**(context or {}), "speaker": speaker}
+            super().add_memory(content, embedding, importance, context, timestamp)
+            row = self._size - 1
+            rows.append(row)
+            self._writers.append({writer})
+            self._embedding_rows.setdefault(content, row)
+            self._pending_embeddings.pop(content, None)
+
+    def get_embedding(self, content: str) -> Optional[np.ndarray]:
+        """The stored vector for a text, or None if it has not been added."""
+        row = self._embedding_rows.get(content)
+        if row is None:
+            return None
+        return self._embeddings[row]
+
+    def add_pending_embedding(self, content: str, future: Future):
+        """Publish a vector still being computed, until its row is added.
+
+        A speaker's response is embedded in the background, so listeners
+        usually embed the message before it is stored; they reuse this
+        future instead.
+        """
+        with self._add_lock:
+            if content not in self._embedding_rows:
+                self._pending_embeddings.setdefault(content, future)
+
+    def get_pending_embedding(self, content: str) -> Optional[Future]:
+        """The in-flight vector for a text, or None if there is none."""
+        return self._pending_embeddings.get(content)
+
+    def copy_to(self, store: LongTermMemory) -> int:
+        """Copy the rows `store` does not have yet into it; returns how many.
+
+        Participants sharing one store (e.g. two agents with the same
+        persona) therefore get the transcript written to it once.
+        """
+        with self._add_lock:
+            start = self._copied.get(id(store), 0)
+            end = len(self.memories)
+            self._copied[id(store)] = end
+        for row in range(start, end):
+            memory = self.memories[row]
+            store.add_memory(
+                content=memory.content,
+                embedding=self._embeddings[row],
+                importance=memory.importance,
+                context=memory.context,
+                timestamp=memory.timestamp_seconds,
+            )
+        return end - start
+
+
+class PersistentLongTermMemory(LongTermMemory):
+    """LongTermMemory backed by files in `path`, so it survives restarts.
+
+    - embeddings.f32: memory-mapped float32 matrix, one row per memory
+    - memories.jsonl: append-only memory records; their count is the store size
+    - index.faiss: serialized FAISS index, written by `save`
+
+    Reopening a store maps the embeddings and reads the saved index instead
+    of re-embedding anything. Memories added after the last `save` are
+    appended to the index from the mapped embeddings.
+    """
+
+    EMBEDDINGS_FILE = "embeddings.f32"
+    RECORDS_FILE = "memories.jsonl"
+    INDEX_FILE = "index.faiss"
+
+    _open_stores: Dict[str, "PersistentLongTermMemory"] = {}
+    _open_lock = threading.Lock()
+
+    def __init__(
+        self,
+        path: str,
+        embedding_dim: int = 768,
+        initial_capacity: int = 1024,
+        index_type: str = "flat",
+    ):
+        super().__init__(
+            embedding_dim=embedding_dim, initial_capacity=1, index_type=index_type
+        )
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+        self.memories = self._load_records()
+        self._size = len(self.memories)
+        self._map_embeddings(max(initial_capacity, self._size))
+        self.index = self._load_index()
+        self.index_type = get_index_type(self.index)
+        self._trained_size = self.index.ntotal
+
+        self._records_file = open(self.path / self.RECORDS_FILE, "a", encoding="utf-8")
+        self._maybe_rebuild_index()
+
+    @classmethod
+    def open(
+        cls, path: str, embedding_dim: int = 768, index_type: str = "flat"
+    ) -> "PersistentLongTermMemory":
+        """Open the store at `path`, sharing it with anyone who already has it open."""
+        key = str(Path(path).resolve())
+        with cls._open_lock:
+            if key not in cls._open_stores:
+                cls._open_stores[key] = cls(
+                    path, embedding_dim=embedding_dim, index_type=index_type
+                )
+            return cls._open_stores[key]
+
+    def _load_records(self) -> MemoryColumns:
+        memories = MemoryColumns()
+        records_path = self.path / self.RECORDS_FILE
+        if not records_path.exists():
+            return memories
+
+        data = records_path.read_bytes()
+        # Drop a trailing partial record left behind by a crash mid-write
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            with open(records_path, "r+b") as f:
+                f.truncate(end)
+
+        for line in data[:end].splitlines():
+            record = json.loads(line)
+            memories.append(
+                record["content"],
+                datetime.fromisoformat(record["timestamp"]).timestamp(),
+                record["importance"],
+                record["context"],
+            )
+        return memories
+
+    def _map_embeddings(self, capacity: int):
+        """(Re)map the embedding file with room for at least `capacity` rows."""
+        embeddings_path = self.path / self.EMBEDDINGS_FILE
+        row_bytes = self.embedding_dim * np.dtype("float32").itemsize
+        existing_rows = (
+            embeddings_path.stat().st_size // row_bytes
+            if embeddings_path.exists()
+            else 0
+        )
+        capacity = max(capacity, existing_rows, 1)
+        if existing_rows < capacity:
+            with open(embeddings_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+
+        if isinstance(self._embeddings, np.memmap):
+            self._embeddings.flush()
+        self._embeddings = np.memmap(
+            embeddings_path,
+            dtype="float32",
+            mode="r+",
+            shape=(capacity, self.embedding_dim),
+        )
+
+    def _reserve(self, capacity: int):
+        if capacity <= self._embeddings.shape[0]:
+            return
+        self._map_embeddings(max(capacity, self._embeddings.shape[0] * 2))
+
+    def _load_index(self) -> faiss.Index:
+        index_path = self.path / self.INDEX_FILE
+        if index_path.exists():
+            index = faiss.read_index(str(index_path))
+            if index.d == self.embedding_dim and index.ntotal <= self._size:
+                # Catch up on memories added after the index was last saved
+                if index.ntotal < self._size:
+                    index.add(np.asarray(self._embeddings[index.ntotal : self._size]))
+                return index
+
+        index = faiss.IndexFlatL2(self.embedding_dim)
+        if self._size:
+            index.add(np.asarray(self.embeddings))
+        return index
+
+    def add_memory(
+        self,
+        content: str,
+        embedding: np.ndarray,
+        importance: float = 1.0,
+        context: Dict[str, str] = None,
+        timestamp: Optional[float] = None,
+    ):
+        with self._lock:
+            super().add_memory(content, embedding, importance, context, timestamp)
+
+            # The record is written after the embedding row, so a record on
+            # disk always has its embedding
+            memory = self.memories[-1]
+            record = {
+                "content": memory.content,
+                "timestamp": memory.timestamp.isoformat(),
+                "importance": memory.importance,
+                "context": memory.context,
+            }
+            self._records_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._records_file.flush()
+
+    def save(self):
+        """Flush embeddings and records and write the index to disk."""
+        with self._lock:
+            self._embeddings.flush()
+            self._records_file.flush()
+            os.fsync(self._records_file.fileno())
+
+            index_path = self.path / self.INDEX_FILE
+            tmp_path = index_path.with_suffix(".tmp")
+            with self._index_lock:
+                faiss.write_index(self.index, str(tmp_path))
+            os.replace(tmp_path, index_path)
+
+    def close(self):
+        """Save the store and release its files."""
+        self.save()
+        self._records_file.close()
+        with self._open_lock:
+            self._open_stores.pop(str(self.path.resolve()), None)
@@ -0,0 +1,186 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import threading
+import time
+
+# Upper bounds in seconds; spans embedding lookups through slow LLM calls
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values, one series per label set."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # Per label set: [per-bucket counts (+Inf last), sum, count]
+        self.series: Dict[LabelKey, List] = {}
+
+    def observe(self, value: float, labels: LabelKey):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+
+class Metrics:
+    """Process-wide counters, histograms and gauges in Prometheus text format.
+
+    Stage timers feed a histogram per stage and, when given a dict, record
+    the elapsed seconds there too, so the same numbers are attached to each
+    logged message. Profiling hooks registered with `add_hook` are called
+    with every timed stage.
+    """
+
+    _lock = threading.Lock()
+    _counters: Dict[str, Dict[LabelKey, float]] = {}
+    _histograms: Dict[str, Histogram] = {}
+    _gauges: Dict[str, Callable[[], float]] = {}
+    _help: Dict[str, str] = {}
+    _hooks: List[Callable[[str, float, Dict[str, str]], None]] = []
+
+    @staticmethod
+    def _labels(labels: Dict[str, str]) -> LabelKey:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    @classmethod
+    def describe(cls, name: str, help_text: str):
+        cls._help[name] = help_text
+
+    @classmethod
+    def increment(cls, name: str, value: float = 1.0, **labels):
+        key = cls._labels(labels)
+        with cls._lock:
+            series = cls._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    @classmethod
+    def observe(cls, name: str, value: float, **labels):
+        key = cls._labels(labels)
+        with cls._lock:
+            histogram = cls._histograms.get(name)
+            if histogram is None:
+                histogram = cls._histograms[name] = Histogram()
+            histogram.observe(value, key)
+
+    @classmethod
+    def gauge(cls, name: str, callback: Callable[[], float], help_text: str = None):
+        """Report `callback()` as a gauge each time metrics are rendered."""
+        with cls._lock:
+            cls._gauges[name] = callback
+        if help_text:
+            cls.describe(name, help_text)
+
+    @classmethod
+    def add_hook(cls, hook: Callable[[str, float, Dict[str, str]], None]):
+        """Call `hook(stage, seconds, labels)` after every timed stage."""
+        cls._hooks.append(hook)
+
+    @classmethod
+    def remove_hook(cls, hook: Callable[[str, float, Dict[str, str]], None]):
+        cls._hooks.remove(hook)
+
+    @classmethod
+    @contextmanager
+    def timer(
+        cls, stage: str, timing: Optional[Dict[str, float]] = None, **labels
+    ) -> Iterator[None]:
+        """Time a block as `stage`, adding its seconds to `timing` if given."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if timing is not None:
+                timing[stage] = timing.get(stage, 0.0) + elapsed
+            cls.observe("stage_seconds", elapsed, stage=stage, **labels)
+            for hook in cls._hooks:
+                hook(stage, elapsed, labels)
+
+    @staticmethod
+    def _format_labels(labels: LabelKey, extra: Tuple = ()) -> str:
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (
+            (key, value.replace("\\", "\\\\").replace('"', '\\"'))
+            for key, value in pairs
+        )
+        return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+    @classmethod
+    def render(cls) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+
+        def header(name: str, metric_type: str):
+            if name in cls._help:
+                lines.append(f"# HELP {name} {cls._help[name]}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        with cls._lock:
+            counters = {name: dict(series) for name, series in cls._counters.items()}
+            histograms = {
+                name: (
+                    histogram.buckets,
+                    {k: [list(v[0]), v[1], v[2]] for k, v in histogram.series.items()},
+                )
+                for name, histogram in cls._histograms.items()
+            }
+            gauges = dict(cls._gauges)
+
+        for name, series in sorted(counters.items()):
+            header(name, "counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{cls._format_labels(labels)} {value:g}")
+
+        for name, (buckets, series) in sorted(histograms.items()):
+            header(name, "histogram")
+            for labels, (counts, total, count) in sorted(series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    bucket_labels = cls._format_labels(labels, (("le", str(bound)),))
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{name}_sum{cls._format_labels(labels)} {total:g}")
+                lines.append(f"{name}_count{cls._format_labels(labels)} {count}")
+
+        for name, callback in sorted(gauges.items()):
+            try:
+                value = float(callback())
+            except Exception:
+                continue
+            header(name, "gauge")
+            lines.append(f"{name} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def reset(cls):
+        """Drop all recorded values; gauges and hooks stay registered."""
+        with cls._lock:
+            cls._counters.clear()
+            cls._histograms.clear()
+
+
+Metrics.describe("stage_seconds", "Time spent in each stage of a turn")
@@ -0,0 +1,124 @@
+"""Warm heavy dependencies and models ahead of the first request.
+
+Heavy modules are imported lazily, so without preloading the first simulation
+pays for importing faiss, torch and transformers and for loading the
+embedding model. `Preloader.preload` does that work up front, optionally on a
+background thread while the server already accepts connections, and records
+how long each step took. Run this module directly as a prefetch step, e.g.
+to download and cache the model when building an image.
+
+Usage:
+    python src/preload.py [--model sentence-transformers/all-mpnet-base-v2]
+"""
+
+import argparse
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from lazy import load
+
+DEFAULT_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+
+class Preloader:
+    """Process-wide record of startup and preload timings."""
+
+    _timings: Dict[str, float] = {}
+    _errors: Dict[str, str] = {}
+    _lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+    _ready = threading.Event()
+
+    @classmethod
+    def record(cls, step: str, seconds: float):
+        with cls._lock:
+            cls._timings[step] = seconds
+
+    @classmethod
+    def _step(cls, step: str, work: Callable[[], object]):
+        start = time.perf_counter()
+        try:
+            work()
+        except Exception as e:
+            # One failed step (e.g. a missing optional dependency) should not
+            # stop the rest; the first real use will raise it again
+            with cls._lock:
+                cls._errors[step] = str(e)
+        cls.record(step, time.perf_counter() - start)
+
+    @classmethod
+    def _run(cls, model_names: List[str], openai_model: str):
+        from embeddings import EmbeddingService
+        from llm import LLMService
+        from prompts import TokenCounter
+
+        start = time.perf_counter()
+        for module in ("faiss", "torch", "transformers"):
+            cls._step(f"import {module}", lambda module=module: load(module))
+        for model_name in model_names:
+            cls._step(
+                f"load {model_name}",
+                lambda name=model_name: EmbeddingService.get_engine(name),
+            )
+            cls._step(
+                f"warm up {model_name}",
+                lambda name=model_name: EmbeddingService.get_model(name).embed_batch(
+                    ["warm up"]
+                ),
+            )
+        cls._step("tokenizer", lambda: TokenCounter(openai_model).count("warm up"))
+        cls._step("llm backend", LLMService.get_backend)
+        cls.record("preload total", time.perf_counter() - start)
+        cls._ready.set()
+
+    @classmethod
+    def preload(
+        cls,
+        model_names: List[str] = (DEFAULT_MODEL,),
+        openai_model: str = "gpt-4o",
+        background: bool = False,
+    ):
+        """Import heavy dependencies and load `model_names`.
+
+        With `background=True` this returns immediately; requests that need a
+        model before it is loaded wait for it rather than loading it twice.
+        """
+        if background:
+            cls._thread = threading.Thread(
+                target=cls._run,
+                args=(list(model_names), openai_model),
+                name="preload",
+                daemon=True,
+            )
+            cls._thread.start()
+        else:
+            cls._run(list(model_names), openai_model)
+
+    @classmethod
+    def wait(cls, timeout: Optional[float] = None) -> bool:
+        """Block until preloading has finished; returns False on timeout."""
+        return cls._ready.wait(timeout)
+
+    @classmethod
+    def report(cls) -> Dict:
+        """Seconds spent in each startup step, plus any step that failed."""
+        with cls._lock:
+            return {
+                "ready": cls._ready.is_set(),
+                "seconds": dict(cls._timings),
+                "errors": dict(cls._errors),
+            }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", action="append")
+    parser.add_argument("--openai-model", default="gpt-4o")
+    args = parser.parse_args()
+
+    Preloader.preload(args.model or [DEFAULT_MODEL], args.openai_model)
+    report = Preloader.report()
+    for step, seconds in report["seconds"].items():
+        error = report["errors"].get(step)
+        print(f"{step:<56} {seconds:8.3f} s" + (f"  FAILED: {error}" if error else ""))
@@ -0,0 +1,217 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from conversation_moves import ConversationMoves
+from memory import Memory
+
+PERSONA_TEMPLATE = """You are {name}, an AI agent having a conversation. Your core traits and background:
+
+BACKSTORY:
+{backstory}
+
+PERSONALITY:
+- Tone: {tone}
+- Interests: {interests}
+- Communication style: {communication_style}
+
+GOALS:
+{goals}
+
+CONVERSATION GUIDELINES:
+1. Use the specified conversation move naturally and subtly
+2. Maintain authentic character voice while pursuing your goals
+3. Draw from your specific life experiences and backstory
+4. Keep responses concise (1-3 sentences)
+5. Stay focused on the current topic
+6. Build on the previous message naturally
+
+"""
+
+MOVE_TEMPLATE = """CURRENT CONVERSATION MOVE:
+- Type: {move}
+- Description: {description}
+- Effect: {effect}
+- Example structure: {example}
+
+"""
+
+CONTEXT_TEMPLATE = """Recent conversation context:
+{recent_context}
+
+Relevant past context:
+{long_term_context}
+
+Remember to maintain your unique voice while keeping responses brief and engaging."""
+
+
+class PromptBuilder:
+    """Assembles an agent's system prompt from precompiled sections.
+
+    The persona section (backstory, personality, goals and guidelines) is
+    compiled once per personality version and each move section once per
+    process, so a turn only formats its memory sections. Sections are ordered
+    from most to least stable so consecutive prompts share the longest
+    possible prefix for provider-side prompt caching.
+    """
+
+    _move_sections: Dict[str, str] = {}
+
+    def __init__(self, personality: Dict):
+        self.personality = personality
+        self._persona_section: Optional[str] = None
+
+    def set_personality(self, personality: Dict):
+        """Switch to a new personality and drop the compiled persona section."""
+        self.personality = personality
+        self._persona_section = None
+
+    def invalidate(self):
+        """Recompile the persona section on next use, after in-place changes."""
+        self._persona_section = None
+
+    @property
+    def persona_section(self) -> str:
+        if self._persona_section is None:
+            self._persona_section = PERSONA_TEMPLATE.format(
+                name=self.personality["name"],
+                backstory=self.personality.get(
+                    "backstory", "No detailed backstory available."
+                ),
+                tone=self.personality["tone"],
+                interests=self.personality["interests"],
+                communication_style=self.personality["communication_style"],
+                goals="\n".join(
+                    f"- {goal}" for goal in self.personality.get("goals", [])
+                ),
+            )
+        return self._persona_section
+
+    @classmethod
+    def move_section(cls, move: str) -> str:
+        section = cls._move_sections.get(move)
+        if section is None:
+            move_info = ConversationMoves.get_move_description(move)
+            section = MOVE_TEMPLATE.format(
+                move=move,
+                description=move_info["description"],
+                effect=move_info["effect"],
+                example=move_info["example"],
+            )
+            cls._move_sections[move] = section
+        return section
+
+    def build(
+        self,
+        selected_move: str,
+        recent_memories: List[Memory],
+        relevant_long_term_memories: List[Tuple[Memory, float]],
+    ) -> str:
+        """Build the system prompt for one turn."""
+        recent_context = "\n".join(f"- {memory.content}" for memory in recent_memories)
+        long_term_context = "\n".join(
+            f"- {memory.content} (relevance: {score:.2f})"
+            for memory, score in relevant_long_term_memories
+        )
+        return (
+            self.persona_section
+            + self.move_section(selected_move)
+            + CONTEXT_TEMPLATE.format(
+                recent_context=recent_context, long_term_context=long_term_context
+            )
+        )
+
+
+class TokenCounter:
+    """Counts tokens locally with the model's tiktoken encoding.
+
+    Falls back to a four-characters-per-token estimate when tiktoken is not
+    installed or its encoding cannot be loaded, e.g. offline before the BPE
+    file is cached. Counts are cached, since the same memories recur turn to
+    turn.
+    """
+
+    # Encodings by model, including failed loads, so each is tried once
+    _encodings: Dict[str, object] = {}
+
+    def __init__(self, model: str = "gpt-4o", cache_size: int = 4096):
+        if model not in self._encodings:
+            self._encodings[model] = self._load_encoding(model)
+        self._encoding = self._encodings[model]
+
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    @staticmethod
+    def _load_encoding(model: str):
+        try:
+            import tiktoken
+        except ImportError:
+            return None
+        try:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                return tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # The encoding is downloaded on first use
+            print(f"Could not load tiktoken encoding, estimating tokens: {str(e)}")
+            return None
+
+    def _count(self, text: str) -> int:
+        if self._encoding is None:
+            return max(1, len(text) // 4)
+        return len(self._encoding.encode(text))
+
+
+class ContextPacker:
+    """Fits the memory sections of a prompt into a token budget.
+
+    Recent memories are packed first, newest first, then long-term memories
+    in ranked order. Long-term memories whose content is already in the
+    recent section are dropped.
+    """
+
+    def __init__(self, token_counter: TokenCounter, max_tokens: int = 1000):
+        self.token_counter = token_counter
+        self.max_tokens = max_tokens
+
+    def pack(
+        self,
+        recent_memories: List[Memory],
+        relevant_long_term_memories: List[Tuple[Memory, float]],
+    ) -> Tuple[List[Memory], List[Tuple[Memory, float]], Dict[str, int]]:
+        """Select the memories to include; returns them with token counts."""
+        remaining = self.max_tokens
+        unpacked_tokens = 0
+        seen = set()
+
+        packed_recent = []
+        recent_full = False
+        for memory in recent_memories:
+            tokens = self.token_counter.count(f"- {memory.content}\n")
+            unpacked_tokens += tokens
+            # Stop at the first miss so the recent section has no gaps
+            if recent_full or tokens > remaining:
+                recent_full = True
+                continue
+            packed_recent.append(memory)
+            seen.add(memory.content)
+            remaining -= tokens
+
+        packed_long_term = []
+        for memory, score in relevant_long_term_memories:
+            tokens = self.token_counter.count(
+                f"- {memory.content} (relevance: {score:.2f})\n"
+            )
+            unpacked_tokens += tokens
+            if memory.content in seen or tokens > remaining:
+                continue
+            packed_long_term.append((memory, score))
+            seen.add(memory.content)
+            remaining -= tokens
+
+        context_tokens = self.max_tokens - remaining
+        stats = {
+            "context_tokens": context_tokens,
+            "tokens_saved": unpacked_tokens - context_tokens,
+        }
+        return packed_recent, packed_long_term, stats
@@ -0,0 +1,125 @@
+"""Replay a logged simulation offline.
+
+Rebuilds a run from a conversation log in `logs/`: every agent processes each
+turn as they did originally (embeddings, memory, prompt packing) with the
+logged conversation move, but each LLM call returns the logged response
+instead of calling the network. As in the scheduler, the agents share one
+transcript segment and the rest of the group hears each response.
+With `--save` the replayed run is written as a new log, including the
+per-turn metrics, so it can be compared against the original.
+
+Usage:
+    python src/replay.py logs/conversation_<timestamp>_<session>.jsonl [--save]
+"""
+
+import argparse
+import asyncio
+from pathlib import Path
+from typing import Dict
+
+import yaml
+
+from agent import ConversationAgent
+from llm import ReplayBackend
+from logger import ConversationLogger, load_log
+from memory import SharedMemory
+
+CONFIG_DIR = Path(__file__).parent / "config"
+
+
+def load_personalities() -> Dict[str, Dict]:
+    """Get agent personalities from the config, keyed by display name."""
+    with open(CONFIG_DIR / "agents.yaml", "r") as f:
+        agents = yaml.safe_load(f)["agents"]
+    return {personality["name"]: personality for personality in agents.values()}
+
+
+async def replay(log_path: str, save: bool = False):
+    log = load_log(log_path)
+
+    personalities = load_personalities()
+    participants = log.get("participants") or [log["agent1"], log["agent2"]]
+    agents = {
+        name: ConversationAgent(
+            personality=personalities[name],
+            llm_backend=ReplayBackend.from_log(log_path, name),
+        )
+        for name in participants
+    }
+    shared_memory = SharedMemory(
+        embedding_dim=agents[participants[0]].embedding_engine.embedding_dim
+    )
+    for agent in agents.values():
+        agent.shared_memory = shared_memory
+    logger = None
+    if save:
+        logger = ConversationLogger(
+            f"replay-{log['session_id']}",
+            log["agent1"],
+            log["agent2"],
+            log["topic"],
+            participants=log.get("participants"),
+        )
+        logger.log_message("topic", None, log["topic"])
+
+    message = log["topic"]
+    last_speaker = None
+    responses = [entry for entry in log["messages"] if entry["type"] == "response"]
+    for turn, entry in enumerate(responses):
+        agent = agents[entry["agent"]]
+        # The previous responder said the message; before anyone has, the
+        # scheduler names the participant after the first speaker
+        if last_speaker is None:
+            index = participants.index(entry["agent"])
+            last_speaker = participants[(index + 1) % len(participants)]
+        response = await agent.process_message_async(
+            message,
+            context={
+                "speaker": last_speaker,
+                "turn": turn // len(participants),
+                "timestamp": entry["timestamp"],
+            },
+            # The original run drew its moves unseeded, so replay the logged ones
+            move=entry.get("move"),
+        )
+        message = response["content"]
+        last_speaker = entry["agent"]
+
+        # The next logged speaker stores the reply in its own turn; the rest
+        # hear it now. After the last response everyone else hears it
+        next_speaker = None
+        if turn + 1 < len(responses):
+            next_speaker = responses[turn + 1]["agent"]
+        context = {
+            "speaker": last_speaker,
+            "turn": turn // len(participants),
+            "timestamp": entry["timestamp"],
+        }
+        for name, listener in agents.items():
+            if name not in (last_speaker, next_speaker):
+                listener.observe(message, context)
+        print(f"{entry['agent']} [{response['move']}]: {message}")
+
+        if logger:
+            logger.log_message(
+                "response",
+                entry["agent"],
+                message,
+                move=response["move"],
+                move_description=response["move_description"],
+                metrics={**response["timing"], **response["context_stats"]},
+            )
+
+    for agent in agents.values():
+        await agent.flush_memory_writes()
+    if logger:
+        logger.end_conversation()
+        print(f"Saved replay to {logger.log_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("log_path")
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(replay(args.log_path, args.save))
@@ -0,0 +1,289 @@
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import asyncio
+import random
+import threading
+
+from logger import ConversationLogger
+
+
+class RoundRobinTurns:
+    """Participants speak in a fixed order; with two agents they alternate."""
+
+    def next_speaker(
+        self, participants: List, last_speaker: Optional[int], message: str
+    ) -> int:
+        if last_speaker is None:
+            return 0
+        return (last_speaker + 1) % len(participants)
+
+
+class RandomTurns:
+    """A random participant speaks next, never the same one twice in a row."""
+
+    def __init__(self, seed: Optional[int] = None):
+        self._rng = random.Random(seed)
+
+    def next_speaker(
+        self, participants: List, last_speaker: Optional[int], message: str
+    ) -> int:
+        choices = [i for i in range(len(participants)) if i != last_speaker]
+        return self._rng.choice(choices)
+
+
+class AddressedTurns(RoundRobinTurns):
+    """A participant named in the last message answers it; otherwise round robin."""
+
+    def next_speaker(
+        self, participants: List, last_speaker: Optional[int], message: str
+    ) -> int:
+        lowered = message.lower()
+        for i, agent in enumerate(participants):
+            if i != last_speaker and agent.personality["name"].lower() in lowered:
+                return i
+        return super().next_speaker(participants, last_speaker, message)
+
+
+def get_participants(simulation: Dict) -> List:
+    """Agents taking part in a simulation, in speaking order."""
+    if "agents" in simulation:
+        return simulation["agents"]
+    return [simulation["agent1"], simulation["agent2"]]
+
+
+class SimulationScheduler:
+    """Runs simulations as coroutines on a dedicated asyncio event loop.
+
+    Each simulation is an iterative loop of turns rather than a chain of
+    recursive calls, and every LLM and embedding call is awaited, so one
+    process can interleave many sessions. At most `max_concurrent_sessions`
+    simulations run at once.
+
+    A simulation has either `agent1` and `agent2` or a list of `agents`, and
+    `turn_policy` picks who speaks next. While one agent generates its
+    reply, every other participant embeds and stores the previous message
+    concurrently, so the work per message does not grow with the group size.
+    """
+
+    def __init__(
+        self,
+        emit: Callable[[str, Dict, str], None],
+        max_concurrent_sessions: int = 32,
+        turn_delay: float = 2.0,
+        stream: bool = True,
+        turn_policy=None,
+    ):
+        self.emit = emit
+        self.max_concurrent_sessions = max_concurrent_sessions
+        self.turn_delay = turn_delay
+        self.stream = stream
+        # Default policy for simulations that do not set their own
+        self.turn_policy = turn_policy or RoundRobinTurns()
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="simulation-scheduler", daemon=True
+        )
+        self._thread.start()
+
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def active_sessions(self) -> int:
+        return len(self._tasks)
+
+    def start_simulation(
+        self,
+        session_id: str,
+        simulation: Dict,
+        logger: Optional[ConversationLogger] = None,
+    ) -> bool:
+        """Schedule a simulation; returns False if the session cap is reached."""
+        with self._lock:
+            if (
+                session_id in self._tasks
+                or len(self._tasks) >= self.max_concurrent_sessions
+            ):
+                return False
+            # Reserve the slot; the task itself is created on the loop thread
+            self._tasks[session_id] = None
+
+        asyncio.run_coroutine_threadsafe(
+            self._create_task(session_id, simulation, logger), self.loop
+        ).result()
+        return True
+
+    def stop_simulation(self, session_id: str, timeout: float = 10.0) -> bool:
+        """Cancel a running simulation and wait until it has fully stopped.
+
+        Returns False if it is still stopping after `timeout` seconds; the
+        cancellation carries on in the background, so callers can go ahead
+        with their own cleanup.
+        """
+        with self._lock:
+            task = self._tasks.get(session_id)
+        if task is None:
+            return True
+        try:
+            asyncio.run_coroutine_threadsafe(self._cancel(task), self.loop).result(
+                timeout
+            )
+        except FutureTimeoutError:
+            print(f"Simulation {session_id} did not stop within {timeout}s")
+            return False
+        return True
+
+    def shutdown(self, timeout: float = 10.0):
+        """Stop every simulation, then the event loop and its thread."""
+        with self._lock:
+            session_ids = list(self._tasks)
+        for session_id in session_ids:
+            self.stop_simulation(session_id, timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self.loop.close()
+
+    async def _create_task(
+        self,
+        session_id: str,
+        simulation: Dict,
+        logger: Optional[ConversationLogger],
+    ) -> asyncio.Task:
+        task = self.loop.create_task(self._run(session_id, simulation, logger))
+        with self._lock:
+            self._tasks[session_id] = task
+        task.add_done_callback(lambda _: self._forget(session_id))
+        return task
+
+    def _forget(self, session_id: str):
+        with self._lock:
+            self._tasks.pop(session_id, None)
+
+    @staticmethod
+    async def _cancel(task: asyncio.Task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(
+        self,
+        session_id: str,
+        simulation: Dict,
+        logger: Optional[ConversationLogger],
+    ):
+        try:
+            while simulation["is_active"]:
+                await self._run_turn(session_id, simulation, logger)
+        except Exception as e:
+            simulation["is_active"] = False
+            self.emit("error", {"message": f"Simulation failed: {str(e)}"}, session_id)
+        finally:
+            # Leave every agent's memory complete once the session has stopped
+            await asyncio.gather(
+                *(
+                    agent.flush_memory_writes()
+                    for agent in get_participants(simulation)
+                ),
+                return_exceptions=True,
+            )
+
+    async def _run_turn(
+        self,
+        session_id: str,
+        simulation: Dict,
+        logger: Optional[ConversationLogger],
+    ):
+        """Let each participant speak once, feeding each reply to the next."""
+        participants = get_participants(simulation)
+        policy = simulation.get("turn_policy") or self.turn_policy
+        for _ in range(len(participants)):
+            if not simulation["is_active"]:
+                return
+
+            speaker = simulation.pop("next_speaker", None)
+            if speaker is None:
+                speaker = policy.next_speaker(
+                    participants,
+                    simulation.get("last_speaker"),
+                    simulation["current_message"],
+                )
+            agent = participants[speaker]
+            agent_name = agent.personality["name"]
+            self.emit(
+                "simulation_message",
+                {"type": "thinking", "agent": agent_name},
+                session_id,
+            )
+
+            def emit_token(token: str, agent_name: str = agent_name):
+                self.emit(
+                    "simulation_message",
+                    {"type": "token", "agent": agent_name, "content": token},
+                    session_id,
+                )
+
+            # Whoever said the current message; the other agent before anyone has
+            last_speaker = simulation.get("last_speaker")
+            if last_speaker is None:
+                last_speaker = (speaker + 1) % len(participants)
+            response = await agent.process_message_async(
+                simulation["current_message"],
+                context={
+                    "speaker": participants[last_speaker].personality["name"],
+                    "turn": simulation["turn"],
+                    "timestamp": datetime.now().isoformat(),
+                },
+                on_token=emit_token if self.stream else None,
+            )
+
+            # The next speaker stores the reply as part of its own turn; the
+            # rest of the group hears it now, concurrently with that turn
+            next_speaker = policy.next_speaker(
+                participants, speaker, response["content"]
+            )
+            simulation["next_speaker"] = next_speaker
+            context = {
+                "speaker": agent_name,
+                "turn": simulation["turn"],
+                "timestamp": datetime.now().isoformat(),
+            }
+            for i, listener in enumerate(participants):
+                if i not in (speaker, next_speaker):
+                    listener.observe(response["content"], context)
+
+            if logger:
+                logger.log_message(
+                    "response",
+                    agent_name,
+                    response["content"],
+                    move=response["move"],
+                    move_description=response["move_description"],
+                    metrics={**response["timing"], **response["context_stats"]},
+                )
+
+            self.emit(
+                "simulation_message",
+                {
+                    "type": "response",
+                    "agent": agent_name,
+                    "content": response["content"],
+                    "move": response["move"],
+                    "move_description": response["move_description"],
+                    "timing": response["timing"],
+                    "context_stats": response["context_stats"],
+                },
+                session_id,
+            )
+
+            simulation["current_message"] = response["content"]
+            simulation["last_speaker"] = speaker
+
+            # Small delay between responses
+            await asyncio.sleep(self.turn_delay)
+
+        simulation["turn"] += 1